@@ -1,143 +1,679 @@
+import argparse
 import asyncio
+import contextlib
+import contextvars
 import json
 import logging
-from datetime import datetime
+import time
+from datetime import timedelta
 
-import discord
-from discord import app_commands
+# Taken before the discord/sqlalchemy/chat imports below so startup metrics include their cost.
+PROCESS_STARTED = time.perf_counter()
 
-import data_models
-import chat
-import goal_management  # noqa: F401
-import recent_messages
+import discord  # noqa: E402
+from discord import app_commands  # noqa: E402
+
+import data_models  # noqa: E402
+import chat  # noqa: E402
+import goal_management  # noqa: E402, F401
+import metrics  # noqa: E402
+import recent_messages  # noqa: E402
+import turns  # noqa: E402
+from chat import rag  # noqa: E402
+from turn_queue import TurnQueue  # noqa: E402
 
-logging.basicConfig(
-    level=logging.CRITICAL,
-    format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-    datefmt="%H:%M:%S",
-)
-logging.getLogger("ibis.bot").setLevel(logging.INFO)
-logging.getLogger("ibis.chat").setLevel(logging.INFO)
-logging.getLogger("ibis.chat.judges").setLevel(logging.INFO)
 logger = logging.getLogger("ibis.bot")
+CURRENT_SLOT = contextvars.ContextVar("turn_slot", default=None)
+
+KEYRING_PATH = "keyring.json"
+BUSY_REPLY = "i'm kinda swamped rn, try me again in a sec"
+ERROR_REPLY = "ugh something broke on my end, try me again in a bit"
+METRICS_LOG_SECONDS = 300
+TASK_ARCHIVE_SECONDS = 3600
+TASK_SCHEDULER_SECONDS = 60
+REPLY_POLL_SECONDS = 0.2
+SUMMARY_SWEEP_SECONDS = 30
+MAX_DEFERRED_MESSAGES = 5
+SHED_RETRY_SECONDS = 10
+GUILD = None
+
+
+def configure_logging():
+    logging.basicConfig(
+        level=logging.CRITICAL,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    logging.getLogger("ibis.bot").setLevel(logging.INFO)
+    logging.getLogger("ibis.chat").setLevel(logging.INFO)
+    logging.getLogger("ibis.chat.judges").setLevel(logging.INFO)
+    logging.getLogger("ibis.metrics").setLevel(logging.INFO)
+
+
+def load_keyring(path=KEYRING_PATH):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def connect_database(keyring):
+    data_models.initialize_connection(
+        keyring["db_url"],
+        pool_size=keyring.get("db_pool_size", 5),
+        max_overflow=keyring.get("db_max_overflow", 10),
+        use_async=True,
+        lazy_schema=True,
+    )
+
+
+class TurnScheduler:
+    def __init__(self, max_concurrent_turns, max_queued_per_user, max_queued_total):
+        self.max_queued_per_user = max_queued_per_user
+        self.max_queued_total = max_queued_total
+        self.slots = asyncio.Semaphore(max_concurrent_turns)
+        self.lanes = {}
+        self.queued_by_user = {}
+        self.queued = 0
+        self.running = 0
+
+    @contextlib.asynccontextmanager
+    async def lane(self, key):
+        entry = self.lanes.get(key)
+        if entry is None:
+            entry = self.lanes[key] = {"lock": asyncio.Lock(), "holders": 0}
+        entry["holders"] += 1
+        try:
+            async with entry["lock"]:
+                yield
+        finally:
+            entry["holders"] -= 1
+            if entry["holders"] == 0:
+                del self.lanes[key]
+
+    @contextlib.asynccontextmanager
+    async def slot(self):
+        await self.slots.acquire()
+        held = {"held": True}
+        token = CURRENT_SLOT.set(held)
+        try:
+            yield
+        finally:
+            CURRENT_SLOT.reset(token)
+            if held["held"]:
+                self.slots.release()
+
+    @contextlib.asynccontextmanager
+    async def guild_lane(self, server_key):
+        held = CURRENT_SLOT.get()
+        if held is None or not held["held"]:
+            async with self.lane(("guild", server_key)):
+                yield
+            return
+        self.slots.release()
+        held["held"] = False
+        async with self.lane(("guild", server_key)):
+            await self.slots.acquire()
+            held["held"] = True
+            yield
+
+    def _track_queued(self, user_key, delta):
+        self.queued += delta
+        self.queued_by_user[user_key] = self.queued_by_user.get(user_key, 0) + delta
+        if not self.queued_by_user[user_key]:
+            del self.queued_by_user[user_key]
+        metrics.set_gauge("scheduler.queue_depth", self.queued)
+        chat.DEGRADATION.set_in_flight(self.queued + self.running)
+
+    def admits(self, user_key):
+        return self.queued < self.max_queued_total and self.queued_by_user.get(user_key, 0) < self.max_queued_per_user
+
+    async def run(self, user_key, job):
+        if not self.admits(user_key):
+            metrics.incr("scheduler.shed")
+            logger.info("Shedding turn for user=%s (queued=%d).", user_key, self.queued)
+            return False
+        self._track_queued(user_key, 1)
+        enqueued_at = time.monotonic()
+        started = False
+        try:
+            async with self.lane(("user", user_key)), self.slot():
+                started = True
+                self._track_queued(user_key, -1)
+                waited = time.monotonic() - enqueued_at
+                metrics.observe("scheduler.wait_seconds", waited)
+                chat.DEGRADATION.observe("queue_wait", waited)
+                self.running += 1
+                metrics.set_gauge("scheduler.running", self.running)
+                started_at = time.monotonic()
+                try:
+                    await job()
+                finally:
+                    self.running -= 1
+                    metrics.set_gauge("scheduler.running", self.running)
+                    chat.DEGRADATION.set_in_flight(self.queued + self.running)
+                    metrics.observe("turn.seconds", time.monotonic() - started_at)
+        finally:
+            if not started:
+                self._track_queued(user_key, -1)
+        metrics.incr("scheduler.completed")
+        return True
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(1.0, burst)
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def refill(self, now):
+        self.tokens = min(self.burst, self.tokens + max(0.0, now - self.updated_at) * self.rate)
+        self.updated_at = max(self.updated_at, now)
+        return self.tokens
+
+    def retry_after(self):
+        return max(0.0, (1.0 - self.tokens) / self.rate)
+
+
+class AdmissionControl:
+    MAX_BUCKETS = 10000
+
+    def __init__(self, user_turns_per_minute, user_burst, guild_turns_per_minute, guild_burst):
+        self.limits = {
+            "user": (user_turns_per_minute / 60, user_burst),
+            "guild": (guild_turns_per_minute / 60, guild_burst),
+        }
+        self.buckets = {}
+
+    def _buckets(self, user_id, server_key):
+        keys = [("user", user_id)]
+        if server_key is not None:
+            keys.append(("guild", server_key))
+        buckets = []
+        for key in keys:
+            rate, burst = self.limits[key[0]]
+            if rate <= 0:
+                continue
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = TokenBucket(rate, burst)
+            buckets.append((key[0], bucket))
+        return buckets
+
+    def admit(self, user_id, server_key):
+        now = time.monotonic()
+        buckets = self._buckets(user_id, server_key)
+        for scope, bucket in buckets:
+            if bucket.refill(now) < 1.0:
+                metrics.incr(f"admission.rejected.{scope}")
+                return False
+        for _, bucket in buckets:
+            bucket.tokens -= 1.0
+        if len(self.buckets) > self.MAX_BUCKETS:
+            self._prune(now)
+        metrics.incr("admission.admitted")
+        return True
+
+    def refund(self, user_id, server_key):
+        for _, bucket in self._buckets(user_id, server_key):
+            bucket.tokens = min(bucket.burst, bucket.tokens + 1.0)
+        metrics.incr("admission.refunded")
+
+    def retry_after(self, user_id, server_key):
+        now = time.monotonic()
+        waits = []
+        for _, bucket in self._buckets(user_id, server_key):
+            bucket.refill(now)
+            waits.append(bucket.retry_after())
+        return max(waits, default=0.0)
+
+    def _prune(self, now):
+        for key, bucket in list(self.buckets.items()):
+            if bucket.refill(now) >= bucket.burst:
+                del self.buckets[key]
+
+
+class DirectMessageQueue:
+    def __init__(self, messages_per_second, max_size):
+        self.interval = 1.0 / messages_per_second
+        self.queue = asyncio.Queue(maxsize=max_size)
+
+    async def put(self, user_id, text):
+        await self.queue.put((user_id, text))
+        metrics.set_gauge("dm_queue.depth", self.queue.qsize())
+
+    async def run(self):
+        while True:
+            user_id, text = await self.queue.get()
+            metrics.set_gauge("dm_queue.depth", self.queue.qsize())
+            try:
+                user = client.get_user(user_id) or await client.fetch_user(user_id)
+                await user.send(text)
+                metrics.incr("dm_queue.sent")
+            except discord.HTTPException:
+                logger.warning("Could not DM user=%s", user_id)
+                metrics.incr("dm_queue.failed")
+            await asyncio.sleep(self.interval)
+
+
+client = None
+tree = None
+scheduler = None
+admission = None
+dm_queue = None
+turn_queue = None
+ready_at = None
+background_tasks = {}
+pending_interactions = {}
+pending_flushes = set()
+active_turns = {}
+deferred_messages = {}
+deferred_flushes = {}
+
+
+def create_client(keyring):
+    global client, tree, scheduler, admission, dm_queue, turn_queue, GUILD
+    global METRICS_LOG_SECONDS, TASK_ARCHIVE_SECONDS, TASK_SCHEDULER_SECONDS, REPLY_POLL_SECONDS, SUMMARY_SWEEP_SECONDS
+    global MAX_DEFERRED_MESSAGES
+    METRICS_LOG_SECONDS = keyring.get("metrics_log_seconds", METRICS_LOG_SECONDS)
+    TASK_ARCHIVE_SECONDS = keyring.get("task_archive_seconds", TASK_ARCHIVE_SECONDS)
+    TASK_SCHEDULER_SECONDS = keyring.get("task_scheduler_seconds", TASK_SCHEDULER_SECONDS)
+    REPLY_POLL_SECONDS = keyring.get("reply_poll_seconds", REPLY_POLL_SECONDS)
+    SUMMARY_SWEEP_SECONDS = keyring.get("summary_sweep_seconds", SUMMARY_SWEEP_SECONDS)
+    MAX_DEFERRED_MESSAGES = keyring.get("max_deferred_messages", MAX_DEFERRED_MESSAGES)
+    turns.configure(keyring)
+    GUILD = discord.Object(id=keyring["guild_id"])
+
+    turn_queue_path = keyring.get("turn_queue_path")
+    client_cls = discord.AutoShardedClient if turn_queue_path else discord.Client
+    client = client_cls(intents=discord.Intents.default())
+    for handler in (on_message, on_message_edit, on_raw_message_delete, on_ready):
+        client.event(handler)
+    tree = app_commands.CommandTree(client)
+    tree.add_command(update_cmd, guild=GUILD)
+    turn_queue = TurnQueue(turn_queue_path) if turn_queue_path else None
+    max_concurrent_turns = keyring.get("max_concurrent_turns", 8)
+    scheduler = TurnScheduler(
+        max_concurrent_turns=max_concurrent_turns,
+        max_queued_per_user=keyring.get("max_queued_turns_per_user", 3),
+        max_queued_total=keyring.get("max_queued_turns", 100),
+    )
+    chat.DEGRADATION.configure(concurrency=max_concurrent_turns)
+    admission = AdmissionControl(
+        user_turns_per_minute=keyring.get("user_turns_per_minute", 6),
+        user_burst=keyring.get("user_turn_burst", 3),
+        guild_turns_per_minute=keyring.get("guild_turns_per_minute", 60),
+        guild_burst=keyring.get("guild_turn_burst", 10),
+    )
+    dm_queue = DirectMessageQueue(
+        messages_per_second=keyring.get("dm_messages_per_second", 1.0),
+        max_size=keyring.get("dm_queue_size", 1000),
+    )
+    return client
+
+
+def start_background_task(name, coro_fn):
+    task = background_tasks.get(name)
+    if task is None or task.done():
+        background_tasks[name] = asyncio.create_task(coro_fn(), name=name)
+
+
+async def warm_up():
+    with metrics.timed("startup.schema_check_seconds"):
+        await data_models.ensure_schema_async()
+    with metrics.timed("startup.openai_client_seconds"):
+        await asyncio.to_thread(chat.get_client)
+    with metrics.timed("startup.lyrics_cache_seconds"):
+        await asyncio.to_thread(rag.ensure_cache_loaded)
+
+
+async def flush_summary(row):
+    flush_key = (row.user_id, row.server_key)
+    if flush_key in pending_flushes:
+        return
+    pending_flushes.add(flush_key)
+    job_id = None
+    try:
+        if turn_queue is not None:
+            payload = {
+                "user_id": row.user_id,
+                "display_name": row.name,
+                "server_key": row.server_key,
+                "kind": "summary_flush",
+            }
+            job_id = await asyncio.to_thread(
+                turn_queue.enqueue, row.user_id, payload, scheduler.max_queued_per_user, scheduler.max_queued_total
+            )
+            return
+        guild_lane = scheduler.guild_lane(row.server_key) if row.server_key else None
+        async with scheduler.lane(("user", row.user_id)), scheduler.slot():
+            if await turns.flush_pending_turns(row.user_id, row.name, row.server_key, memory_lane=guild_lane):
+                metrics.incr("summary.idle_flush")
+    finally:
+        if job_id is None:
+            pending_flushes.discard(flush_key)
+
+
+async def flush_idle_summaries_periodically():
+    while True:
+        await asyncio.sleep(SUMMARY_SWEEP_SECONDS)
+        try:
+            idle_before = data_models.utcnow() - timedelta(seconds=turns.SUMMARY_IDLE_SECONDS)
+            rows = await data_models.idle_pending_turns(idle_before)
+            results = await asyncio.gather(*(flush_summary(row) for row in rows), return_exceptions=True)
+            for row, result in zip(rows, results):
+                if isinstance(result, Exception):
+                    logger.error("Summary flush failed for user=%s", row.user_id, exc_info=result)
+        except Exception:
+            logger.exception("Summary sweep failed.")
 
-with open("keyring.json", "r", encoding="utf-8") as f:
-    keyring = json.load(f)
 
-BOT_TOKEN = keyring["discord_token"]
-GUILD = discord.Object(id=keyring["guild_id"])
-data_models.initialize_connection(keyring["db_url"])
-chat.initialize_connection(keyring)
+async def log_metrics_periodically():
+    while True:
+        await asyncio.sleep(METRICS_LOG_SECONDS)
+        metrics.log_snapshot()
 
-client = discord.Client(intents=discord.Intents.default())
-tree = app_commands.CommandTree(client)
+
+async def archive_tasks_periodically():
+    while True:
+        try:
+            archived = await data_models.archive_completed_tasks()
+            if archived:
+                logger.info("Archived %d completed tasks.", archived)
+        except Exception:
+            logger.exception("Task archiving failed.")
+        await asyncio.sleep(TASK_ARCHIVE_SECONDS)
+
+
+async def run_task_scheduler():
+    while True:
+        try:
+            reset = await data_models.reset_daily_tasks()
+            if reset:
+                logger.info("Reset %d daily tasks.", reset)
+            while True:
+                reminders = await data_models.claim_due_reminders()
+                for reminder in reminders:
+                    await dm_queue.put(reminder.user_id, f"hey, reminder: {reminder.description}")
+                if len(reminders) < data_models.TASK_BATCH_SIZE:
+                    break
+        except Exception:
+            logger.exception("Task scheduler tick failed.")
+        await asyncio.sleep(TASK_SCHEDULER_SECONDS)
 
 
 def clip_reply_text(text):
     return text if len(text) <= 1900 else text[:1900] + "…"
 
 
-def save_context(context, server_key):
-    discord_id = context.discord_id
-    with data_models.Session() as session:
-        user = session.get(data_models.User, discord_id)
-        user.update_profile(context.user["profile"])
-        user.conversation_summary = context.user["conversation_summary"]
-        gm = session.get(data_models.GlobalMemory, server_key)
-        if not gm:
-            gm = data_models.GlobalMemory(key=server_key, content=context.global_memory)
-            session.add(gm)
-        else:
-            gm.content = context.global_memory
-        session.commit()
+async def prepare_input(text, message):
+    if not message:
+        return text, None
+    bot_user_id = client.user.id
+    clean_text = await recent_messages.replace_mentions(message, bot_user_id)
+    context_text = await recent_messages.collect_recent_messages(
+        message,
+        bot_user_id,
+        history_limit=10,
+        reply_chain_limit=5,
+    )
+    return clean_text, context_text
 
 
-async def build_context(discord_user, text, message, server_key):
-    is_dm = message is None or message.guild is None
-    bot_user_id = client.user.id
-    with data_models.Session() as session:
-        user = session.get(data_models.User, discord_user.id)
-        user_dict = user.to_jsonable()
+async def merge_earlier(clean_text, earlier):
+    if not earlier:
+        return clean_text
+    texts = [await recent_messages.replace_mentions(older, client.user.id) for older in earlier]
+    return "\n".join(texts + [clean_text])
 
-        clean_text = await recent_messages.replace_mentions(message, bot_user_id) if message else text
-        if is_dm:
-            global_memory = ""
-        else:
-            gm = session.get(data_models.GlobalMemory, server_key)
-            if not gm:
-                gm = data_models.GlobalMemory(key=server_key, content="")
-                session.add(gm)
-                session.commit()
-            global_memory = gm.content
-
-    context = chat.ConversationContext(
-        current_time=datetime.now().isoformat(timespec="minutes"),
-        user=user_dict,
-        discord_username=discord_user.display_name,
-        input_text=clean_text,
-        discord_id=discord_user.id,
-        global_memory=global_memory,
+
+async def run_turn(discord_user, text, message, server_key, cancel_token=None, superseded=()):
+    clean_text, context_text = await prepare_input(text, message)
+    clean_text = await merge_earlier(clean_text, superseded)
+    return await turns.run_turn(
+        discord_user,
+        server_key,
+        clean_text,
+        context_text,
+        memory_lane=scheduler.guild_lane(server_key) if server_key else None,
+        cancel_token=cancel_token,
+        channel_id=message.channel.id if message else None,
+    )
+
+
+def supersede_turn(message, earlier=()):
+    key = (message.author.id, message.channel.id)
+    turn = {"token": chat.CancelToken(), "messages": [*earlier, message]}
+    previous = active_turns.get(key)
+    if previous is not None and previous["token"].cancel():
+        metrics.incr("turns.superseded")
+        turn["messages"] = previous["messages"] + turn["messages"]
+    active_turns[key] = turn
+    return key, turn
+
+
+def release_turn(key, turn):
+    if active_turns.get(key) is turn:
+        del active_turns[key]
+
+
+async def enqueue_turn(discord_user, text, message, server_key, kind, earlier=()):
+    clean_text, context_text = await prepare_input(text, message)
+    clean_text = await merge_earlier(clean_text, earlier)
+    payload = {
+        "user_id": discord_user.id,
+        "display_name": discord_user.display_name,
+        "text": clean_text,
+        "recent_messages": context_text,
+        "server_key": server_key,
+        "channel_id": message.channel.id if message else None,
+        "message_id": message.id if message else None,
+        "kind": kind,
+    }
+    job_id = await asyncio.to_thread(
+        turn_queue.enqueue,
+        discord_user.id,
+        payload,
+        scheduler.max_queued_per_user,
+        scheduler.max_queued_total,
     )
-    if message:
-        context.recent_messages = await recent_messages.collect_recent_messages(
-            message,
-            bot_user_id,
-            history_limit=10,
-            reply_chain_limit=5,
-        )
-    if is_dm:
-        context.global_memory = ""
-    return context, server_key
-
-
-@client.event
+    if job_id is None:
+        metrics.incr("scheduler.shed")
+    return job_id
+
+
+async def deliver_reply(job_id, status, payload, result):
+    interaction = pending_interactions.pop(job_id, None)
+    if status != "done":
+        logger.error("Turn job %s failed in worker:\n%s", job_id, result)
+    if payload["kind"] == "summary_flush":
+        pending_flushes.discard((payload["user_id"], payload["server_key"]))
+        return
+    reply_text = clip_reply_text(result or "") if status == "done" else ERROR_REPLY
+    if payload["kind"] == "interaction":
+        if interaction is not None:
+            await interaction.followup.send(reply_text)
+        return
+    channel = client.get_channel(payload["channel_id"]) or await client.fetch_channel(payload["channel_id"])
+    await channel.get_partial_message(payload["message_id"]).reply(reply_text, mention_author=False)
+
+
+async def route_replies():
+    while True:
+        try:
+            finished = await asyncio.to_thread(turn_queue.take_finished)
+            metrics.set_gauge("turn_queue.depth", await asyncio.to_thread(turn_queue.depth))
+        except Exception:
+            logger.exception("Polling the turn queue failed.")
+            finished = []
+        for job in finished:
+            try:
+                await deliver_reply(*job)
+            except discord.HTTPException:
+                logger.warning("Could not deliver reply for job=%s", job[0])
+        if not finished:
+            await asyncio.sleep(REPLY_POLL_SECONDS)
+
+
 async def on_message(message: discord.Message):
+    if client.user:
+        recent_messages.ingest_message(message, client.user.id)
     if message.author.bot:
         return
     if client.user and client.user in message.mentions:
         content = message.content
         if not content:
             return
-        async with message.channel.typing():
-            data_models.User.ensure_user(message.author)
-            server_key = str(message.guild.id) if message.guild else "dm_global"
-            context, server_key = await build_context(
-                message.author,
-                content,
-                message,
-                server_key,
-            )
-            reply_text = await asyncio.to_thread(context.chat)
-            await asyncio.to_thread(save_context, context, server_key)
-            await message.reply(clip_reply_text(reply_text), mention_author=False)
+        server_key = str(message.guild.id) if message.guild else None
+        if not admission.admit(message.author.id, server_key):
+            defer_message(message, server_key)
+            return
+        await handle_mention(message, server_key)
 
 
-@tree.command(
+def stash_messages(key, messages):
+    if not messages:
+        return
+    stash = deferred_messages[key] = sorted([*deferred_messages.get(key, []), *messages], key=lambda m: m.id)
+    if len(stash) > MAX_DEFERRED_MESSAGES:
+        metrics.incr("admission.dropped", len(stash) - MAX_DEFERRED_MESSAGES)
+        del stash[:-MAX_DEFERRED_MESSAGES]
+
+
+def defer_messages(key, messages, server_key, delay=0.0):
+    stash_messages(key, messages)
+    if deferred_messages.get(key) and key not in deferred_flushes:
+        deferred_flushes[key] = asyncio.create_task(flush_deferred(key, key[0], server_key, delay))
+
+
+def defer_message(message, server_key):
+    defer_messages((message.author.id, message.channel.id), [message], server_key)
+
+
+async def flush_deferred(key, user_id, server_key, delay=0.0):
+    try:
+        while deferred_messages.get(key):
+            await asyncio.sleep(max(delay, admission.retry_after(user_id, server_key)))
+            if deferred_messages.get(key) and admission.admit(user_id, server_key):
+                stash = deferred_messages.pop(key)
+                accepted = await handle_mention(stash[-1], server_key, stash[:-1])
+                delay = 0.0 if accepted else SHED_RETRY_SECONDS
+    except Exception:
+        logger.exception("Deferred turn failed for user=%s", user_id)
+    finally:
+        del deferred_flushes[key]
+
+
+async def shed_mention(message, server_key, earlier):
+    admission.refund(message.author.id, server_key)
+    defer_messages((message.author.id, message.channel.id), earlier, server_key, SHED_RETRY_SECONDS)
+    await message.reply(BUSY_REPLY, mention_author=False)
+    return False
+
+
+async def handle_mention(message, server_key, earlier=()):
+    content = message.content
+    earlier = [*earlier, *deferred_messages.pop((message.author.id, message.channel.id), [])]
+    if turn_queue is not None:
+        if await enqueue_turn(message.author, content, message, server_key, "message", earlier) is None:
+            return await shed_mention(message, server_key, earlier)
+        metrics.incr("admission.coalesced", len(earlier))
+        return True
+
+    if not scheduler.admits(message.author.id):
+        metrics.incr("scheduler.shed")
+        return await shed_mention(message, server_key, earlier)
+    metrics.incr("admission.coalesced", len(earlier))
+    key, turn = supersede_turn(message, earlier)
+
+    async def job():
+        try:
+            turn["token"].check("queued")
+            async with message.channel.typing():
+                reply_text = await run_turn(
+                    message.author, content, message, server_key, turn["token"], turn["messages"][:-1]
+                )
+        except chat.TurnCancelled:
+            logger.info("Dropped superseded turn for user=%s", message.author.id)
+            return
+        finally:
+            release_turn(key, turn)
+        await message.reply(clip_reply_text(reply_text), mention_author=False)
+    if not await scheduler.run(message.author.id, job):
+        release_turn(key, turn)
+        return await shed_mention(message, server_key, earlier)
+    return True
+
+
+async def on_message_edit(before: discord.Message, after: discord.Message):
+    if client.user:
+        recent_messages.update_message(after, client.user.id)
+
+
+async def on_raw_message_delete(payload: discord.RawMessageDeleteEvent):
+    recent_messages.remove_message(payload.channel_id, payload.message_id)
+
+
+@app_commands.command(
     name="update",
     description="Describe updates; the bot will add/complete goals or tasks",
-    guild=GUILD,
 )
 @app_commands.describe(text="Describe what changed or what to add")
 async def update_cmd(interaction: discord.Interaction, text: str):
     await interaction.response.defer()
+    if not admission.admit(interaction.user.id, None):
+        await interaction.followup.send(BUSY_REPLY)
+        return
+    if turn_queue is not None:
+        job_id = await enqueue_turn(interaction.user, text, None, None, "interaction")
+        if job_id is None:
+            admission.refund(interaction.user.id, None)
+            await interaction.followup.send(BUSY_REPLY)
+        else:
+            pending_interactions[job_id] = interaction
+        return
 
-    data_models.User.ensure_user(interaction.user)
-    server_key = str(interaction.guild.id) if interaction.guild else "dm_global"
-    context, server_key = await build_context(
-        interaction.user,
-        text,
-        None,
-        server_key,
-    )
-    reply_text = await asyncio.to_thread(context.chat)
-    await asyncio.to_thread(save_context, context, server_key)
-    await interaction.followup.send(clip_reply_text(reply_text))
+    async def job():
+        reply_text = await run_turn(interaction.user, text, None, None)
+        await interaction.followup.send(clip_reply_text(reply_text))
+    if not await scheduler.run(interaction.user.id, job):
+        admission.refund(interaction.user.id, None)
+        await interaction.followup.send(BUSY_REPLY)
 
 
-@client.event
 async def on_ready():
+    global ready_at
+    if ready_at is None:
+        ready_at = time.perf_counter()
+        metrics.set_gauge("startup.ready_seconds", ready_at - PROCESS_STARTED)
+        logger.info("Ready %.2fs after process start.", ready_at - PROCESS_STARTED)
+    start_background_task("warm_up", warm_up)
     await tree.sync(guild=GUILD)
     await client.change_presence(activity=discord.Game("Roar of thunder, hear my uwu!"))
+    start_background_task("metrics_log", log_metrics_periodically)
+    start_background_task("task_archive", archive_tasks_periodically)
+    start_background_task("dm_queue", dm_queue.run)
+    start_background_task("task_scheduler", run_task_scheduler)
+    start_background_task("summary_sweep", flush_idle_summaries_periodically)
+    if turn_queue is not None:
+        start_background_task("route_replies", route_replies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Discord bot.")
+    parser.add_argument("--keyring", default=KEYRING_PATH)
+    args = parser.parse_args(argv)
+
+    configure_logging()
+    with metrics.timed("startup.keyring_seconds"):
+        keyring = load_keyring(args.keyring)
+    with metrics.timed("startup.db_connect_seconds"):
+        connect_database(keyring)
+    chat.initialize_connection(keyring)
+    with metrics.timed("startup.discord_client_seconds"):
+        create_client(keyring)
+    logger.info("Connecting to the gateway %.2fs after process start.", time.perf_counter() - PROCESS_STARTED)
+    client.run(keyring["discord_token"])
 
 
-client.run(BOT_TOKEN)
+if __name__ == "__main__":
+    main()
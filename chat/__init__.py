@@ -1,12 +1,22 @@
+import asyncio
+import inspect
 import json
 import logging
+from threading import Lock
 
-from openai import OpenAI
+import metrics
+
+from . import memory
+from .cancellation import CancelToken, TurnCancelled, check_cancelled
+from .degradation import DEGRADATION
 from .judges import PERSONA, PersonaRewriteJudge, SummaryRewriteJudge
-from .query import Querier, run_required_tool_call
-from .rag import lookup_key_text_context
+from .query import Querier, configure_routes, run_required_tool_call
+from .rag import discard_late_results, lookup_key_text_context, peek_late_results, register_retriever
 
 CLIENT = None
+CLIENT_LOCK = Lock()
+OPENAI_API_KEY = None
+OPENAI_BASE_URL = None
 logger = logging.getLogger("ibis.chat")
 
 TOOLS = []
@@ -15,9 +25,12 @@ TOOL_HANDLERS = {}
 SUMMARY_JUDGE = SummaryRewriteJudge()
 PERSONA_REWRITE_JUDGE = PersonaRewriteJudge()
 RESPOND_NORMALLY_QUERIER = Querier(
+    name="respond_normally",
     instructions=(
         "Respond naturally to the user's latest message.\n"
-        "Use recent_messages, user.conversation_summary, and global_memory when relevant.\n"
+        "Use recent_messages, pending_turns (your latest exchanges with this user, not yet in the summary), "
+        "long_term_memory (older exchanges with this user that look related), "
+        "user.conversation_summary, and global_memory when relevant.\n"
         "When retrieved_context contains directly relevant retrieved evidence, treat it as the factual source "
         "and prioritize it over stale summary/global_memory if they conflict.\n"
         "Base claims on concrete retrieved evidence when possible.\n"
@@ -29,8 +42,30 @@ RESPOND_NORMALLY_QUERIER = Querier(
 
 
 def initialize_connection(keyring):
+    global CLIENT, OPENAI_API_KEY, OPENAI_BASE_URL
+    OPENAI_API_KEY = keyring["openai_api_key"]
+    OPENAI_BASE_URL = keyring.get("openai_base_url")
+    CLIENT = None
+    DEGRADATION.configure(**keyring.get("degradation", {}))
+    memory.configure(keyring)
+    PERSONA_REWRITE_JUDGE.fused = keyring.get("persona_rewrite_mode", "fused") == "fused"
+    PERSONA_REWRITE_JUDGE.threaded = SUMMARY_JUDGE.threaded = keyring.get("revision_threads", True)
+    configure_routes(
+        backends=keyring.get("model_backends"),
+        routes=keyring.get("model_routes"),
+        record=keyring.get("record_querier_inputs"),
+    )
+
+
+def get_client():
     global CLIENT
-    CLIENT = OpenAI(api_key=keyring["openai_api_key"])
+    if CLIENT is None:
+        with CLIENT_LOCK:
+            if CLIENT is None:
+                from openai import OpenAI
+
+                CLIENT = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+    return CLIENT
 
 
 def register_tool(description, parameters, name=None):
@@ -60,17 +95,31 @@ class ConversationContext:
         discord_username,
         input_text,
         discord_id,
+        channel_id=None,
         global_memory="",
         recent_messages=None,
+        loop=None,
+        unit_of_work=None,
+        pending_turns=None,
+        long_term_memory=None,
+        cancel_token=None,
     ):
         self.current_time = current_time
         self.user = user
         self.discord_username = discord_username
         self.input_text = input_text
         self.discord_id = discord_id
+        self.late_key = (discord_id, channel_id)
+        self.late_results = {}
         self.global_memory = global_memory
         self.recent_messages = recent_messages
         self.retrieved_context = {}
+        self.loop = loop
+        self.unit_of_work = unit_of_work
+        self.pending_turns = pending_turns or []
+        self.long_term_memory = long_term_memory or []
+        self.cancel_token = cancel_token
+        self.tier = None
 
     def to_system_context(self):
         return {
@@ -81,11 +130,39 @@ class ConversationContext:
             "discord_id": self.discord_id,
             "global_memory": self.global_memory,
             "recent_messages": self.recent_messages,
+            "pending_turns": self.pending_turns,
+            "long_term_memory": self.long_term_memory,
             "retrieved_context": self.retrieved_context,
         }
 
+    def _run_tool_handler(self, name, args):
+        result = TOOL_HANDLERS[name](self, **args)
+        if not inspect.isawaitable(result):
+            return result
+        if self.loop is None:
+            return asyncio.run(result)
+        return asyncio.run_coroutine_threadsafe(result, self.loop).result()
+
     def chat(self):
-        self.retrieved_context = lookup_key_text_context(CLIENT, self.to_system_context())
+        reply = self.respond()
+        check_cancelled(self.cancel_token, "update_memory")
+        self.update_memory(reply)
+        return reply
+
+    def _quality_tier(self):
+        if self.tier is None:
+            self.tier = DEGRADATION.current()
+            metrics.incr(f"degradation.turns.{self.tier['name']}")
+        return self.tier
+
+    def respond(self):
+        tier = self._quality_tier()
+        check_cancelled(self.cancel_token, "retrieval")
+        if tier["retrieval"]:
+            self.late_results = peek_late_results(self.late_key)
+            self.retrieved_context = lookup_key_text_context(
+                get_client(), self.to_system_context(), late_key=self.late_key, late_results=self.late_results
+            )
 
         context_payload = self.to_system_context()
         context_json = json.dumps(context_payload, ensure_ascii=False, indent=2, sort_keys=True)
@@ -95,7 +172,7 @@ class ConversationContext:
         )
         logger.info("Received chat message.\n%s", context_json)
         msg = run_required_tool_call(
-            client=CLIENT,
+            client=get_client(),
             messages=[
                 {
                     "role": "system",
@@ -113,6 +190,7 @@ class ConversationContext:
             ],
             tools=TOOLS,
             temperature=0.4,
+            cancel_token=self.cancel_token,
         )
         actions = []
         for call in msg.tool_calls:
@@ -123,18 +201,44 @@ class ConversationContext:
                 call.function.name,
                 json.dumps(args, ensure_ascii=False, indent=2, sort_keys=True),
             )
-            actions.append(TOOL_HANDLERS[call.function.name](self, **args))
+            actions.append(self._run_tool_handler(call.function.name, args))
         response = "\n".join(actions)
-        reply = PERSONA_REWRITE_JUDGE.revise(CLIENT, response, context_payload)
+        if not tier["judges"]:
+            return response
+        return PERSONA_REWRITE_JUDGE.revise(
+            get_client(),
+            response,
+            context_payload,
+            max_revisions=tier["persona_revisions"],
+            cancel_token=self.cancel_token,
+        )
+
+    def commit(self):
+        if self.cancel_token is not None:
+            self.cancel_token.commit()
+        discard_late_results(self.late_key, self.late_results)
 
-        turn_text = f"{self.discord_username}: {self.input_text}\nXander: {reply}"
+    def turn_text(self, reply):
+        return f"{self.discord_username}: {self.input_text}\nXander: {reply}"
+
+    def update_memory(self, reply):
+        self.fold_turns(self.pending_turns + [self.turn_text(reply)])
+
+    def fold_turns(self, turn_texts):
         summarize_context = {
             "prior_summary": self.user["conversation_summary"],
             "prior_profile": self.user["profile"],
             "prior_global_memory": self.global_memory,
-            "turn_text": turn_text,
+            "turn_text": "\n\n".join(turn_texts),
         }
-        payload = SUMMARY_JUDGE.revise(CLIENT, None, summarize_context)
+        tier = self._quality_tier()
+        payload = SUMMARY_JUDGE.revise(
+            get_client(),
+            None,
+            summarize_context,
+            max_revisions=tier["summary_revisions"],
+            grade=tier["judges"],
+        )
         prev_summary = self.user["conversation_summary"]
         prev_global = self.global_memory
         prev_profile = dict(self.user["profile"])
@@ -155,7 +259,6 @@ class ConversationContext:
             json.dumps(prev_profile, ensure_ascii=False, sort_keys=True),
             json.dumps(self.user["profile"], ensure_ascii=False, sort_keys=True),
         )
-        return reply
 
 
 @register_tool(
@@ -168,15 +271,21 @@ class ConversationContext:
 )
 def respond_normally(context):
     result = RESPOND_NORMALLY_QUERIER.run(
-        CLIENT,
+        get_client(),
         system_context=context.to_system_context(),
         input=context.input_text,
+        cancel_token=context.cancel_token,
     )
     return (result.response or "").strip()
 
 
 __all__ = [
+    "CancelToken",
     "ConversationContext",
+    "DEGRADATION",
+    "TurnCancelled",
+    "get_client",
     "initialize_connection",
+    "register_retriever",
     "register_tool",
 ]
@@ -0,0 +1,77 @@
+import argparse
+import json
+import logging
+import statistics
+import time
+
+import chat
+import metrics
+from chat.judges import PersonaRewriteJudge
+
+SAMPLE = {
+    "candidate": "I don't know that song, but it sounds like it has a sad vibe. What do you like about it?",
+    "context": {
+        "input_text": "have you heard suki kirai by honeyworks?",
+        "discord_username": "mochi",
+        "recent_messages": "[2024-05-01T10:00:00Z] mochi: i've been listening to utaite covers all day",
+        "retrieved_context": {},
+    },
+}
+COUNTERS = ("llm.calls", "llm.prompt_tokens", "llm.cached_prompt_tokens", "llm.completion_tokens")
+MODES = {
+    "two_step": {"fused": False, "threaded": False},
+    "fused": {"fused": True, "threaded": False},
+    "fused_threaded": {"fused": True, "threaded": True},
+}
+
+
+def _load_samples(path):
+    if not path:
+        return [SAMPLE]
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def bench_mode(client, judge, samples, runs, full):
+    before = metrics.snapshot()["counters"]
+    durations = []
+    for _ in range(runs):
+        for sample in samples:
+            started = time.perf_counter()
+            if full:
+                judge.revise(client, sample["candidate"], sample["context"])
+            else:
+                judge.rewrite(client, sample["candidate"], sample["context"], None)
+            durations.append(time.perf_counter() - started)
+    after = metrics.snapshot()["counters"]
+    per_item = {name: (after.get(name, 0) - before.get(name, 0)) / len(durations) for name in COUNTERS}
+    durations.sort()
+    return {
+        "median_seconds": statistics.median(durations),
+        "p95_seconds": durations[min(len(durations) - 1, int(round(0.95 * (len(durations) - 1))))],
+        **per_item,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare persona rewrite modes: two-step, fused, fused with threads.")
+    parser.add_argument("--samples", help="JSON list of {candidate, context} objects.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--full", action="store_true", help="Benchmark the whole revise loop, not one rewrite.")
+    parser.add_argument("--keyring", default="keyring.json")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    with open(args.keyring, "r", encoding="utf-8") as f:
+        keyring = json.load(f)
+    chat.initialize_connection(keyring)
+    samples = _load_samples(args.samples)
+    results = {
+        name: bench_mode(chat.get_client(), PersonaRewriteJudge(**options), samples, args.runs, args.full)
+        for name, options in MODES.items()
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+from threading import Lock
+
+import metrics
+
+
+class TurnCancelled(Exception):
+    pass
+
+
+class CancelToken:
+    def __init__(self):
+        self.lock = Lock()
+        self.cancelled = False
+        self.committed = False
+
+    def cancel(self):
+        with self.lock:
+            if self.committed:
+                return False
+            self.cancelled = True
+            return True
+
+    def check(self, stage=None):
+        if self.cancelled:
+            if stage:
+                metrics.incr(f"turns.cancelled_at.{stage}")
+            raise TurnCancelled(stage)
+
+    def commit(self):
+        with self.lock:
+            self.check("commit")
+            self.committed = True
+
+
+def check_cancelled(token, stage=None):
+    if token is not None:
+        token.check(stage)
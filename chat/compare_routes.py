@@ -0,0 +1,111 @@
+import argparse
+import json
+import logging
+import time
+
+import chat
+from chat import query
+
+logger = logging.getLogger("ibis.chat.compare_routes")
+
+
+def _parse_route(spec, default_client):
+    backend, _, model = spec.partition(":")
+    if backend == "openai":
+        return default_client, model or query.DEFAULT_MODEL
+    return query._backend_client(backend), model
+
+
+def _agreement_keys(querier, keys):
+    if keys:
+        return keys
+    properties = querier.tool["function"]["parameters"].get("properties", {})
+    flags = [name for name, prop in properties.items() if prop.get("type") == "boolean"]
+    return flags or list(properties)
+
+
+def _timed_complete(querier, messages, route):
+    started = time.perf_counter()
+    try:
+        result = querier.complete(None, messages, route=route)
+    except Exception as exc:
+        logger.warning("%s:%s failed: %s", querier.name, route[1], exc)
+        return None, time.perf_counter() - started
+    return result, time.perf_counter() - started
+
+
+def _percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def compare(querier, samples, reference, candidate, keys=None):
+    keys = _agreement_keys(querier, keys) if querier.tool else []
+    timings = {"reference": [], "candidate": []}
+    errors = {"reference": 0, "candidate": 0}
+    agreed = 0
+    compared = 0
+    for sample in samples:
+        messages = sample.get("messages") or [
+            {"role": "system", "content": querier.system_prompt(sample["system_context"])},
+            {"role": "user", "content": sample["input"]},
+        ]
+        results = {}
+        for label, route in (("reference", reference), ("candidate", candidate)):
+            results[label], seconds = _timed_complete(querier, messages, route)
+            timings[label].append(seconds)
+            errors[label] += results[label] is None
+        if not keys or results["reference"] is None or results["candidate"] is None:
+            continue
+        compared += 1
+        ref_args = results["reference"].arguments or {}
+        cand_args = results["candidate"].arguments or {}
+        agreed += all(ref_args.get(key) == cand_args.get(key) for key in keys)
+    return {
+        "querier": querier.name,
+        "samples": len(samples),
+        "agreement_keys": keys,
+        "agreement": agreed / compared if compared else None,
+        "errors": errors,
+        **{
+            f"{label}_{stat}_seconds": _percentile(values, pct)
+            for label, values in timings.items()
+            for stat, pct in (("p50", 50), ("p95", 95))
+        },
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Measure a Querier's latency and agreement on a candidate route against the reference model."
+    )
+    parser.add_argument("--querier", required=True, choices=sorted(query.QUERIERS))
+    parser.add_argument("--samples", required=True, help="JSONL of inputs recorded via record_querier_inputs.")
+    parser.add_argument("--candidate", required=True, help="backend:model, e.g. local:qwen2.5-1.5b-instruct")
+    parser.add_argument("--reference", default=f"openai:{query.DEFAULT_MODEL}")
+    parser.add_argument("--keys", nargs="*", help="Tool argument keys that must match; defaults to boolean flags.")
+    parser.add_argument("--limit", type=int, default=200)
+    parser.add_argument("--keyring", default="keyring.json")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    with open(args.keyring, "r", encoding="utf-8") as f:
+        keyring = json.load(f)
+    chat.initialize_connection(keyring)
+    querier = query.QUERIERS[args.querier]
+    samples = []
+    with open(args.samples, "r", encoding="utf-8") as f:
+        for line in f:
+            sample = json.loads(line)
+            if sample["querier"] == args.querier:
+                samples.append(sample)
+    samples = samples[: args.limit]
+    reference = _parse_route(args.reference, chat.get_client())
+    candidate = _parse_route(args.candidate, chat.get_client())
+    print(json.dumps(compare(querier, samples, reference, candidate, args.keys), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import logging
+import time
+from threading import Lock
+
+import metrics
+
+logger = logging.getLogger("ibis.chat.degradation")
+
+TIERS = [
+    {"name": "full", "retrieval": True, "judges": True, "persona_revisions": None, "summary_revisions": None},
+    {"name": "reduced", "retrieval": True, "judges": True, "persona_revisions": 2, "summary_revisions": 1},
+    {"name": "no_retrieval", "retrieval": False, "judges": True, "persona_revisions": 2, "summary_revisions": 1},
+    {"name": "minimal", "retrieval": False, "judges": False, "persona_revisions": 0, "summary_revisions": 0},
+]
+IN_FLIGHT_MULTIPLIERS = [1.5, 2.0, 4.0]
+DEFAULT_THRESHOLDS = {
+    "in_flight": [12, 16, 32],
+    "queue_wait": [2.0, 5.0, 10.0],
+    "llm_latency": [2.0, 3.0, 5.0],
+}
+RECOVER_RATIO = 0.7
+HOLD_SECONDS = 30.0
+SMOOTHING = 0.2
+BASELINE_SMOOTHING = 0.05
+
+
+class DegradationController:
+    def __init__(self, thresholds=None, recover_ratio=RECOVER_RATIO, hold_seconds=HOLD_SECONDS):
+        self.lock = Lock()
+        self.thresholds = dict(DEFAULT_THRESHOLDS)
+        self.recover_ratio = recover_ratio
+        self.hold_seconds = hold_seconds
+        self.values = dict.fromkeys(self.thresholds, 0.0)
+        self.baselines = {}
+        self.configured = set()
+        self.tier = 0
+        self.changed_at = time.monotonic()
+        self.configure(thresholds=thresholds)
+
+    def configure(self, thresholds=None, recover_ratio=None, hold_seconds=None, concurrency=None):
+        with self.lock:
+            for signal, limits in (thresholds or {}).items():
+                if len(limits) != len(TIERS) - 1:
+                    raise ValueError(f"{signal} needs {len(TIERS) - 1} thresholds, got {len(limits)}")
+                self.thresholds[signal] = list(limits)
+                self.configured.add(signal)
+            if concurrency is not None and "in_flight" not in self.configured:
+                self.thresholds["in_flight"] = [multiplier * concurrency for multiplier in IN_FLIGHT_MULTIPLIERS]
+            if recover_ratio is not None:
+                self.recover_ratio = recover_ratio
+            if hold_seconds is not None:
+                self.hold_seconds = hold_seconds
+
+    def set_in_flight(self, count):
+        with self.lock:
+            self.values["in_flight"] = float(count)
+            self._update()
+
+    def observe(self, signal, value):
+        with self.lock:
+            self.values[signal] = (1 - SMOOTHING) * self.values[signal] + SMOOTHING * value
+            self._update()
+
+    def observe_latency(self, route, seconds):
+        with self.lock:
+            baseline = self.baselines.get(route)
+            if baseline is None:
+                self.baselines[route] = seconds
+                return
+            if self.tier == 0:
+                self.baselines[route] = (1 - BASELINE_SMOOTHING) * baseline + BASELINE_SMOOTHING * seconds
+            ratio = seconds / max(baseline, 1e-3)
+            self.values["llm_latency"] = (1 - SMOOTHING) * self.values["llm_latency"] + SMOOTHING * ratio
+            self._update()
+
+    def current(self):
+        with self.lock:
+            self._update()
+            return TIERS[self.tier]
+
+    def _level(self, scale=1.0):
+        return max(
+            sum(self.values[signal] >= limit * scale for limit in limits) for signal, limits in self.thresholds.items()
+        )
+
+    def _update(self):
+        now = time.monotonic()
+        target = self._level()
+        if target > self.tier:
+            self._set_tier(target, now)
+        elif self.tier and now - self.changed_at >= self.hold_seconds and self._level(self.recover_ratio) < self.tier:
+            self._set_tier(self.tier - 1, now)
+
+    def _set_tier(self, tier, now):
+        previous = TIERS[self.tier]["name"]
+        self.tier = tier
+        self.changed_at = now
+        name = TIERS[tier]["name"]
+        metrics.incr(f"degradation.to_{name}")
+        metrics.set_gauge("degradation.tier", tier)
+        logger.warning("Quality tier %s -> %s (signals=%s)", previous, name, self.values)
+
+
+DEGRADATION = DegradationController()
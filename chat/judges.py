@@ -1,7 +1,14 @@
+import json
 import logging
+import re
+
+from .cancellation import check_cancelled
 from .query import Querier
 
 logger = logging.getLogger("ibis.chat.judges")
+MESSAGE_MAX_CHARS = 140
+SENTENCE_START_PATTERN = re.compile(r"(^|[.!?]\s+)([A-Z])(?=[a-z])")
+PRONOUN_I_PATTERN = re.compile(r"\bI\b(?=$|[\s',.!?])")
 
 PERSONA = (
     "You are Xander, a gay trans-masculine cosplayer chatting on Discord. "
@@ -18,15 +25,34 @@ PERSONA = (
 )
 
 
+def _revision_input(instruction, **changes):
+    payload = {key: value for key, value in changes.items() if value is not None}
+    if not payload:
+        return instruction
+    return f"{json.dumps(payload, ensure_ascii=False)}\n{instruction}"
+
+
 class RewriteJudge:
     MAX_REVISIONS = 3
 
-    def revise(self, client, candidate, context):
+    def __init__(self, threaded=True):
+        self.threaded = threaded
+
+    def open_threads(self, context):
+        return None
+
+    def revise(self, client, candidate, context, max_revisions=None, grade=True, cancel_token=None):
         feedback = None
+        threads = self.open_threads(context) if self.threaded else None
         logger.info("%s_original\n%s", self.__class__.__name__, candidate)
-        for _ in range(self.MAX_REVISIONS):
-            candidate = self.rewrite(client, candidate, context, feedback)
-            ok, feedback = self.evaluate(client, candidate, context)
+        if not grade:
+            check_cancelled(cancel_token, "rewrite")
+            return self.rewrite(client, candidate, context, feedback, threads)
+        for _ in range(self.MAX_REVISIONS if max_revisions is None else max_revisions):
+            check_cancelled(cancel_token, "rewrite")
+            candidate = self.rewrite(client, candidate, context, feedback, threads)
+            check_cancelled(cancel_token, "grade")
+            ok, feedback = self.evaluate(client, candidate, context, threads)
             if ok:
                 return candidate
             logger.info("%s_feedback\n%s", self.__class__.__name__, feedback)
@@ -37,6 +63,7 @@ class RewriteJudge:
 class SummaryRewriteJudge(RewriteJudge):
     MAX_REVISIONS = 3
     GRADE_QUERIER = Querier(
+        name="summary_grade",
         instructions=(
             "Set ok=true only if all gates pass. "
             "1) Summary captures the important updates from this turn. "
@@ -67,6 +94,7 @@ class SummaryRewriteJudge(RewriteJudge):
         temperature=0.0,
     )
     SUMMARIZE_QUERIER = Querier(
+        name="summarize",
         instructions=(
             "Produce summarize_and_profile arguments that pass all summary gates. "
             "Make summary complete, consistent, concise, correctly attributed by speaker, and cumulative. "
@@ -114,33 +142,82 @@ class SummaryRewriteJudge(RewriteJudge):
         temperature=0.0,
     )
 
-    def evaluate(self, client, candidate, context):
-        grade_response = self.GRADE_QUERIER.run(
-            client,
-            system_context={"context": context, "candidate": candidate},
-            input="Grade summarize_and_profile candidate arguments.",
-        )
+    def open_threads(self, context):
+        return {
+            "rewrite": self.SUMMARIZE_QUERIER.thread({"context": context}),
+            "grade": self.GRADE_QUERIER.thread({"context": context}),
+        }
+
+    def evaluate(self, client, candidate, context, threads=None):
+        if threads is None:
+            grade_response = self.GRADE_QUERIER.run(
+                client,
+                system_context={"context": context, "candidate": candidate},
+                input="Grade summarize_and_profile candidate arguments.",
+            )
+        else:
+            grade_response = threads["grade"].run(
+                client,
+                input=_revision_input(
+                    "Grade summarize_and_profile candidate arguments.", candidate=candidate
+                ),
+            )
         return (
             bool(grade_response.arguments["ok"]),
             grade_response.arguments["feedback"],
         )
 
-    def rewrite(self, client, candidate, context, feedback):
-        return self.SUMMARIZE_QUERIER.run(
+    def rewrite(self, client, candidate, context, feedback, threads=None):
+        if threads is None:
+            return self.SUMMARIZE_QUERIER.run(
+                client,
+                system_context={
+                    "context": context,
+                    "candidate": candidate,
+                    "feedback": feedback,
+                },
+                input=context["turn_text"],
+            ).arguments
+        thread = threads["rewrite"]
+        if not thread.rounds:
+            return thread.run(client, input=_revision_input(context["turn_text"], candidate=candidate)).arguments
+        return thread.run(
             client,
-            system_context={
-                "context": context,
-                "candidate": candidate,
-                "feedback": feedback,
-            },
-            input=context["turn_text"],
+            input=_revision_input("Revise your previous arguments to apply this feedback.", feedback=feedback),
         ).arguments
 
 
+def _casual_case(text):
+    text = SENTENCE_START_PATTERN.sub(lambda m: m.group(1) + m.group(2).lower(), text)
+    return PRONOUN_I_PATTERN.sub("i", text)
+
+
+def _split_message(text, max_chars=MESSAGE_MAX_CHARS):
+    parts = []
+    while len(text) > max_chars:
+        cut = text.rfind(" ", 0, max_chars + 1)
+        if cut <= 0:
+            cut = max_chars
+        parts.append(text[:cut].rstrip())
+        text = text[cut:].lstrip()
+    if text:
+        parts.append(text)
+    return parts
+
+
+def format_messages(messages):
+    lines = []
+    for message in messages:
+        message = _casual_case(" ".join(str(message).split())).rstrip(".")
+        lines.extend(_split_message(message))
+    return "\n".join(lines)
+
+
 class PersonaRewriteJudge(RewriteJudge):
     MAX_REVISIONS = 5
     QUALITY_THRESHOLD = 4.0
     MUST_SATISFY_QUERIER = Querier(
+        name="persona_must_satisfy",
         instructions=(
             "Set ok=true only if the following gates pass. "
             "1) Does not contradict the provided context. "
@@ -170,6 +247,7 @@ class PersonaRewriteJudge(RewriteJudge):
         },
     )
     QUALITY_QUERIER = Querier(
+        name="persona_quality",
         instructions=(
             "Score each rubric dimension from 1 (poor) to 5 (excellent). "
             "Return integers for: "
@@ -223,6 +301,7 @@ class PersonaRewriteJudge(RewriteJudge):
         },
     )
     REWRITE_QUERIER = Querier(
+        name="persona_rewrite",
         instructions=(
             "Rewrite the reply in your voice. Apply feedback if provided. "
             "When retrieved_context has directly relevant evidence for the request, align the main claim to that evidence. "
@@ -230,7 +309,32 @@ class PersonaRewriteJudge(RewriteJudge):
         ),
         persona=PERSONA,
     )
+    FUSED_REWRITE_QUERIER = Querier(
+        name="persona_fused_rewrite",
+        instructions=(
+            "Rewrite the reply in your voice. Apply feedback if provided. "
+            "When retrieved_context has directly relevant evidence for the request, align the main claim to that evidence. "
+            "Keep it to 1-2 sentences, written as casual text messages with minimal punctuation and mostly lowercase. "
+            "Return the messages in the 'messages' array, each <=140 characters."
+        ),
+        persona=PERSONA,
+        tool={
+            "type": "function",
+            "function": {
+                "name": "return_messages",
+                "description": "Return the rewritten response as individual text messages.",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "messages": {"type": "array", "items": {"type": "string"}},
+                    },
+                    "required": ["messages"],
+                },
+            },
+        },
+    )
     STYLE_QUERIER = Querier(
+        name="persona_style",
         instructions=(
             "Rewrite as casual text messages: minimal punctuation, mostly lowercase, no formal capitalization. "
             "Return messages in the 'messages' array. Each message must be <=140 characters."
@@ -251,28 +355,41 @@ class PersonaRewriteJudge(RewriteJudge):
         },
     )
 
-    def evaluate(self, client, candidate, context):
-        must_satisfy_response = self.MUST_SATISFY_QUERIER.run(
-            client,
-            system_context={
-                "context": context,
-                "candidate": candidate,
-                "persona": PERSONA,
-            },
-            input="Grade the candidate response.",
+    def __init__(self, fused=True, threaded=True):
+        super().__init__(threaded=threaded)
+        self.fused = fused
+
+    def open_threads(self, context):
+        grade_context = {"context": context, "persona": PERSONA}
+        rewrite_querier = self.FUSED_REWRITE_QUERIER if self.fused else self.REWRITE_QUERIER
+        return {
+            "rewrite": rewrite_querier.thread({"context": context}),
+            "must_satisfy": self.MUST_SATISFY_QUERIER.thread(grade_context),
+            "quality": self.QUALITY_QUERIER.thread(grade_context),
+        }
+
+    def _grade(self, querier, client, candidate, context, thread):
+        if thread is None:
+            return querier.run(
+                client,
+                system_context={
+                    "context": context,
+                    "candidate": candidate,
+                    "persona": PERSONA,
+                },
+                input="Grade the candidate response.",
+            )
+        return thread.run(client, input=_revision_input("Grade the candidate response.", candidate=candidate))
+
+    def evaluate(self, client, candidate, context, threads=None):
+        threads = threads or {}
+        must_satisfy_response = self._grade(
+            self.MUST_SATISFY_QUERIER, client, candidate, context, threads.get("must_satisfy")
         )
         if not bool(must_satisfy_response.arguments["ok"]):
             return False, must_satisfy_response.arguments["feedback"]
 
-        quality_response = self.QUALITY_QUERIER.run(
-            client,
-            system_context={
-                "context": context,
-                "candidate": candidate,
-                "persona": PERSONA,
-            },
-            input="Grade the candidate response.",
-        )
+        quality_response = self._grade(self.QUALITY_QUERIER, client, candidate, context, threads.get("quality"))
         avg = (
             sum(
                 max(1, min(5, int(quality_response.arguments[key])))
@@ -293,16 +410,41 @@ class PersonaRewriteJudge(RewriteJudge):
             feedback = f"Average quality score {avg:.1f} is below {self.QUALITY_THRESHOLD:.1f}."
         return ok, feedback
 
-    def rewrite(self, client, candidate, context, feedback):
-        persona_text = self.REWRITE_QUERIER.run(
-            client,
-            system_context={
-                "context": context,
-                "reply": candidate,
-                "feedback": feedback,
-            },
-            input="Rewrite the candidate response.",
-        ).response
+    def rewrite(self, client, candidate, context, feedback, threads=None):
+        if self.fused:
+            return self._rewrite_fused(client, candidate, context, feedback, threads)
+        return self._rewrite_two_step(client, candidate, context, feedback, threads)
+
+    def _run_rewrite(self, querier, client, candidate, context, feedback, threads):
+        if threads is None:
+            return querier.run(
+                client,
+                system_context={
+                    "context": context,
+                    "reply": candidate,
+                    "feedback": feedback,
+                },
+                input="Rewrite the candidate response.",
+            )
+        thread = threads["rewrite"]
+        if not thread.rounds:
+            return thread.run(
+                client, input=_revision_input("Rewrite the candidate response.", reply=candidate, feedback=feedback)
+            )
+        return thread.run(
+            client, input=_revision_input("Rewrite your previous reply again, applying this feedback.", feedback=feedback)
+        )
+
+    def _rewrite_fused(self, client, candidate, context, feedback, threads=None):
+        messages = self._run_rewrite(
+            self.FUSED_REWRITE_QUERIER, client, candidate, context, feedback, threads
+        ).arguments.get("messages")
+        if isinstance(messages, list) and messages:
+            return format_messages(messages)
+        return candidate
+
+    def _rewrite_two_step(self, client, candidate, context, feedback, threads=None):
+        persona_text = self._run_rewrite(self.REWRITE_QUERIER, client, candidate, context, feedback, threads).response
 
         messages = self.STYLE_QUERIER.run(
             client,
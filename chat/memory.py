@@ -0,0 +1,228 @@
+import argparse
+import hashlib
+import json
+import logging
+import re
+from pathlib import Path
+from threading import Lock, Thread
+
+import numpy as np
+
+import metrics
+
+from .passages import estimate_tokens
+
+logger = logging.getLogger("ibis.chat.memory")
+INDEX_DIR = Path("chat/memory_index")
+EMBEDDER_NAME = "fastembed"
+EMBEDDING_MODEL = "BAAI/bge-small-en-v1.5"
+HASH_DIM = 512
+MEMORY_TOP_K = 5
+MEMORY_TOKEN_CAP = 300
+TOKEN_PATTERN = re.compile(r"\w+")
+EMBEDDERS = {}
+EMBEDDER = None
+EMBEDDER_LOCK = Lock()
+WRITE_LOCK = Lock()
+
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-9)
+
+
+def register_embedder(name):
+    def decorator(factory):
+        EMBEDDERS[name] = factory
+        return factory
+
+    return decorator
+
+
+# Lexical stand-in: hashed unigrams/bigrams only match shared wording, not meaning.
+@register_embedder("hashing")
+class HashingEmbedder:
+    name = f"hashing-{HASH_DIM}"
+    dim = HASH_DIM
+
+    def __init__(self, model_name=None):
+        pass
+
+    def embed(self, texts):
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            tokens = TOKEN_PATTERN.findall(text.casefold())
+            for feature in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+                value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "little")
+                out[row, value % self.dim] += 1.0 if value >> 63 else -1.0
+        return _normalize(out)
+
+
+@register_embedder("fastembed")
+class FastEmbedEmbedder:
+    def __init__(self, model_name):
+        from fastembed import TextEmbedding
+
+        self.model = TextEmbedding(model_name=model_name)
+        self.name = model_name.replace("/", "__")
+        self.dim = len(next(iter(self.model.embed(["probe"]))))
+
+    def embed(self, texts):
+        return _normalize(np.array(list(self.model.embed(texts)), dtype=np.float32))
+
+
+def configure(keyring):
+    global INDEX_DIR, EMBEDDER_NAME, EMBEDDING_MODEL, MEMORY_TOP_K, MEMORY_TOKEN_CAP, EMBEDDER
+    INDEX_DIR = Path(keyring.get("memory_index_dir", INDEX_DIR))
+    EMBEDDER_NAME = keyring.get("memory_embedder", EMBEDDER_NAME)
+    EMBEDDING_MODEL = keyring.get("memory_embedding_model", EMBEDDING_MODEL)
+    MEMORY_TOP_K = keyring.get("memory_top_k", MEMORY_TOP_K)
+    MEMORY_TOKEN_CAP = keyring.get("memory_token_cap", MEMORY_TOKEN_CAP)
+    EMBEDDER = None
+
+
+def get_embedder(rebuild_missing=True):
+    global EMBEDDER
+    if EMBEDDER is None:
+        with EMBEDDER_LOCK:
+            if EMBEDDER is None:
+                try:
+                    embedder = EMBEDDERS[EMBEDDER_NAME](EMBEDDING_MODEL)
+                except Exception:
+                    logger.exception(
+                        "%s embedder is unavailable; falling back to lexical hashed embeddings.", EMBEDDER_NAME
+                    )
+                    embedder = HashingEmbedder()
+                root = INDEX_DIR / embedder.name
+                if rebuild_missing and not root.exists():
+                    root.mkdir(parents=True, exist_ok=True)
+                    Thread(target=_rebuild_all, name="memory-rebuild", daemon=True).start()
+                EMBEDDER = embedder
+    return EMBEDDER
+
+
+def _paths(embedder, user_id):
+    root = INDEX_DIR / embedder.name
+    return root / f"{user_id}.ids", root / f"{user_id}.vec"
+
+
+def _entry_count(embedder, ids_path, vec_path):
+    if not ids_path.exists() or not vec_path.exists():
+        return 0
+    return min(ids_path.stat().st_size // 8, vec_path.stat().st_size // (4 * embedder.dim))
+
+
+def add_turns(user_id, turns):
+    if not turns:
+        return
+    embedder = get_embedder()
+    vectors = embedder.embed([text for _, text in turns]).astype(np.float32)
+    ids = np.array([turn_id for turn_id, _ in turns], dtype=np.int64)
+    ids_path, vec_path = _paths(embedder, user_id)
+    with WRITE_LOCK:
+        ids_path.parent.mkdir(parents=True, exist_ok=True)
+        count = _entry_count(embedder, ids_path, vec_path)
+        with open(ids_path, "ab") as ids_file, open(vec_path, "ab") as vec_file:
+            ids_file.truncate(count * 8)
+            vec_file.truncate(count * 4 * embedder.dim)
+            vec_file.write(vectors.tobytes())
+            ids_file.write(ids.tobytes())
+    metrics.incr("memory.indexed", len(turns))
+
+
+def add_turn(user_id, turn_id, text):
+    add_turns(user_id, [(turn_id, text)])
+
+
+def search(user_id, query, top_k=None):
+    embedder = get_embedder()
+    ids_path, vec_path = _paths(embedder, user_id)
+    count = _entry_count(embedder, ids_path, vec_path)
+    if not count or not query.strip():
+        return []
+    ids = np.fromfile(ids_path, dtype=np.int64, count=count)
+    vectors = np.memmap(vec_path, dtype=np.float32, mode="r", shape=(count, embedder.dim))
+    scores = vectors @ embedder.embed([query])[0]
+    k = min(top_k or 2 * MEMORY_TOP_K, count)
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    metrics.incr("memory.searches")
+    return [int(ids[idx]) for idx in top if scores[idx] > 0]
+
+
+def fit_to_budget(memories, top_k=None, token_cap=None):
+    top_k = top_k or MEMORY_TOP_K
+    token_cap = token_cap or MEMORY_TOKEN_CAP
+    chosen = []
+    used_tokens = 0
+    for text in memories:
+        cost = estimate_tokens(text)
+        if used_tokens + cost > token_cap:
+            continue
+        chosen.append(text)
+        used_tokens += cost
+        if len(chosen) >= top_k:
+            break
+    return chosen
+
+
+def rebuild_index(session, user_ids=None, batch_size=500):
+    import data_models
+
+    embedder = get_embedder(rebuild_missing=False)
+    query = session.query(data_models.TurnHistory.user_id).distinct()
+    if user_ids:
+        query = query.filter(data_models.TurnHistory.user_id.in_(user_ids))
+    for (user_id,) in query.all():
+        for path in _paths(embedder, user_id):
+            path.unlink(missing_ok=True)
+        rows = (
+            session.query(data_models.TurnHistory.turn_id, data_models.TurnHistory.turn_text)
+            .filter(data_models.TurnHistory.user_id == user_id)
+            .order_by(data_models.TurnHistory.turn_id)
+            .yield_per(batch_size)
+        )
+        batch = []
+        for row in rows:
+            batch.append((row.turn_id, row.turn_text))
+            if len(batch) >= batch_size:
+                add_turns(user_id, batch)
+                batch = []
+        add_turns(user_id, batch)
+        logger.info("Rebuilt memory index for user=%s", user_id)
+
+
+def _rebuild_all():
+    import data_models
+
+    if data_models.Session is None:
+        return
+    logger.info("No memory index for embedder=%s; rebuilding from turn history.", get_embedder().name)
+    try:
+        with data_models.Session() as session:
+            rebuild_index(session)
+    except Exception:
+        logger.exception("Rebuilding the memory index failed.")
+        return
+    metrics.incr("memory.rebuilds")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rebuild per-user memory indexes from the turn history table.")
+    parser.add_argument("user_ids", nargs="*", type=int, help="Users to rebuild; all users when omitted.")
+    parser.add_argument("--keyring", default="keyring.json")
+    args = parser.parse_args(argv)
+
+    import data_models
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    with open(args.keyring, "r", encoding="utf-8") as f:
+        keyring = json.load(f)
+    configure(keyring)
+    data_models.initialize_connection(keyring["db_url"])
+    with data_models.Session() as session:
+        rebuild_index(session, args.user_ids)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import re
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"\w+")
+SECTION_LABEL_PATTERN = re.compile(r"^\[[^\]]*\]$")
+STANZA_MAX_LINES = 8
+PASSAGE_TOP_K = 4
+PASSAGE_TOKEN_CAP = 600
+
+
+def _tokenize(text):
+    return TOKEN_PATTERN.findall(text.casefold())
+
+
+def estimate_tokens(text):
+    return len(text) // 4 + 1
+
+
+def split_stanzas(text):
+    stanzas = []
+    current = []
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or SECTION_LABEL_PATTERN.match(line) or len(current) >= STANZA_MAX_LINES:
+            if current:
+                stanzas.append("\n".join(current))
+            current = []
+        if line:
+            current.append(line)
+    if current:
+        stanzas.append("\n".join(current))
+    return stanzas
+
+
+class PassageIndex:
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self, passages):
+        self.passages = passages
+        self.vocab = {}
+        rows = []
+        cols = []
+        for row, passage in enumerate(passages):
+            for token in _tokenize(passage):
+                rows.append(row)
+                cols.append(self.vocab.setdefault(token, len(self.vocab)))
+        tf = np.zeros((len(passages), len(self.vocab)), dtype=np.float32)
+        np.add.at(tf, (np.array(rows, dtype=np.intp), np.array(cols, dtype=np.intp)), 1.0)
+        doc_len = tf.sum(axis=1, keepdims=True)
+        avg_len = max(float(doc_len.mean()), 1.0) if len(passages) else 1.0
+        df = (tf > 0).sum(axis=0)
+        idf = np.log1p((len(passages) - df + 0.5) / (df + 0.5))
+        norm = self.K1 * (1.0 - self.B + self.B * doc_len / avg_len)
+        self.weights = tf * (self.K1 + 1.0) / (tf + norm) * idf
+
+    def score(self, query):
+        counts = {}
+        for token in _tokenize(query):
+            col = self.vocab.get(token)
+            if col is not None:
+                counts[col] = counts.get(col, 0) + 1
+        if not counts:
+            return np.zeros(len(self.passages), dtype=np.float32)
+        cols = np.fromiter(counts.keys(), dtype=np.intp, count=len(counts))
+        freqs = np.fromiter(counts.values(), dtype=np.float32, count=len(counts))
+        return self.weights[:, cols] @ freqs
+
+
+def select_passages(documents, query, top_k=PASSAGE_TOP_K, token_cap=PASSAGE_TOKEN_CAP):
+    owners = []
+    passages = []
+    for key, text in documents.items():
+        for stanza in split_stanzas(text):
+            owners.append(key)
+            passages.append(stanza)
+    if not passages:
+        return {}
+
+    scores = PassageIndex(passages).score(query)
+    order = np.lexsort((np.arange(len(passages)), -scores))
+    chosen = []
+    seen = set()
+    used_tokens = 0
+    for idx in order:
+        if passages[idx] in seen:
+            continue
+        cost = estimate_tokens(passages[idx])
+        if used_tokens + cost > token_cap:
+            continue
+        chosen.append(int(idx))
+        seen.add(passages[idx])
+        used_tokens += cost
+        if len(chosen) >= top_k:
+            break
+
+    selected = {}
+    for idx in sorted(chosen):
+        selected.setdefault(owners[idx], []).append(passages[idx])
+    return {key: "\n\n".join(parts) for key, parts in selected.items()}
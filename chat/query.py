@@ -1,17 +1,106 @@
 import json
+import time
+from threading import Lock
 from types import SimpleNamespace
 
+import metrics
 
-def run_required_tool_call(client, messages, tools, temperature=0.4, token_budgets=None):
+from .cancellation import check_cancelled
+from .degradation import DEGRADATION
+
+THREAD_HISTORY_ROUNDS = 2
+DEFAULT_MODEL = "gpt-4o-mini"
+QUERIERS = {}
+ROUTES = {}
+BACKEND_CONFIGS = {}
+BACKENDS = {}
+BACKENDS_LOCK = Lock()
+RECORD_LOCK = Lock()
+RECORDING = {"path": None, "queriers": set()}
+BACKGROUND_QUERIERS = {"song_title_ner", "song_title_verifier", "translate_lyrics"}
+
+
+def register_backend(name, client):
+    with BACKENDS_LOCK:
+        BACKENDS[name] = client
+
+
+def configure_routes(backends=None, routes=None, record=None):
+    with BACKENDS_LOCK:
+        BACKEND_CONFIGS.clear()
+        BACKEND_CONFIGS.update(backends or {})
+        BACKENDS.clear()
+    ROUTES.clear()
+    ROUTES.update(routes or {})
+    RECORDING["path"] = (record or {}).get("path")
+    RECORDING["queriers"] = set((record or {}).get("queriers", []))
+
+
+def _backend_client(name):
+    with BACKENDS_LOCK:
+        client = BACKENDS.get(name)
+        if client is None:
+            from openai import OpenAI
+
+            config = BACKEND_CONFIGS[name]
+            client = BACKENDS[name] = OpenAI(
+                base_url=config["base_url"],
+                api_key=config.get("api_key", "local"),
+                timeout=config.get("timeout", 60),
+            )
+    return client
+
+
+def resolve_route(name, client):
+    route = ROUTES.get(name)
+    if route is None:
+        return client, DEFAULT_MODEL
+    backend = route.get("backend", "openai")
+    if backend != "openai":
+        client = _backend_client(backend)
+    return client, route.get("model", DEFAULT_MODEL)
+
+
+def _record_input(name, **sample):
+    if not RECORDING["path"] or name not in RECORDING["queriers"]:
+        return
+    line = json.dumps({"querier": name, **sample}, ensure_ascii=False)
+    with RECORD_LOCK, open(RECORDING["path"], "a", encoding="utf-8") as f:
+        f.write(line + "\n")
+
+
+def _record_completion(started, completion, name=None):
+    seconds = time.perf_counter() - started
+    metrics.observe("llm.seconds", seconds)
+    if name:
+        metrics.observe(f"llm.seconds.{name}", seconds)
+    metrics.incr("llm.calls")
+    usage = getattr(completion, "usage", None)
+    if usage is not None:
+        metrics.incr("llm.prompt_tokens", usage.prompt_tokens)
+        metrics.incr("llm.completion_tokens", usage.completion_tokens)
+        details = getattr(usage, "prompt_tokens_details", None)
+        metrics.incr("llm.cached_prompt_tokens", getattr(details, "cached_tokens", None) or 0)
+    if name not in BACKGROUND_QUERIERS:
+        DEGRADATION.observe_latency(name or "default", seconds)
+
+
+def run_required_tool_call(
+    client, messages, tools, temperature=0.4, token_budgets=None, name="tool_router", cancel_token=None
+):
+    client, model = resolve_route(name, client)
     for max_tokens in token_budgets or [200, 320]:
+        check_cancelled(cancel_token, name)
+        started = time.perf_counter()
         completion = client.chat.completions.create(
-            model="gpt-4o-mini",
+            model=model,
             messages=messages,
             tools=tools,
             tool_choice="required",
             temperature=temperature,
             max_tokens=max_tokens,
         )
+        _record_completion(started, completion, name)
         msg = completion.choices[0].message
         if msg.tool_calls:
             return msg
@@ -26,7 +115,11 @@ class Querier:
         tool=None,
         temperature=0.4,
         token_budgets=None,
+        name=None,
     ):
+        self.name = name
+        if name:
+            QUERIERS[name] = self
         self.persona = persona
         self.tool = tool
         self.temperature = temperature
@@ -35,7 +128,18 @@ class Querier:
         if persona:
             self.instructions = f"{instructions}\n" "Follow the persona provided in background_information."
 
-    def run(self, client, input, system_context=None, token_budgets=None):
+    def run(self, client, input, system_context=None, token_budgets=None, cancel_token=None):
+        _record_input(self.name, system_context=system_context, input=input)
+        messages = [
+            {"role": "system", "content": self.system_prompt(system_context)},
+            {"role": "user", "content": input},
+        ]
+        return self.complete(client, messages, token_budgets, cancel_token=cancel_token)
+
+    def thread(self, system_context=None):
+        return QuerierThread(self, system_context)
+
+    def system_prompt(self, system_context=None):
         prompt_parts = []
         if self.persona is not None or system_context is not None:
             background = {}
@@ -61,14 +165,16 @@ class Querier:
                 "Return a concise reply or required tool arguments.",
             ]
         )
-        messages = [
-            {"role": "system", "content": "\n".join(prompt_parts)},
-            {"role": "user", "content": input},
-        ]
+        return "\n".join(prompt_parts)
+
+    def complete(self, client, messages, token_budgets=None, route=None, cancel_token=None):
+        client, model = route or resolve_route(self.name, client)
         budgets = token_budgets or self.token_budgets
         for max_tokens in budgets:
+            check_cancelled(cancel_token, self.name)
+            started = time.perf_counter()
             completion = client.chat.completions.create(
-                model="gpt-4o-mini",
+                model=model,
                 messages=messages,
                 tools=[self.tool] if self.tool else None,
                 tool_choice=(
@@ -86,6 +192,7 @@ class Querier:
                 temperature=self.temperature,
                 max_tokens=max_tokens,
             )
+            _record_completion(started, completion, self.name)
             msg = completion.choices[0].message
             if msg.tool_calls:
                 call = msg.tool_calls[0]
@@ -100,3 +207,25 @@ class Querier:
         if self.tool:
             raise RuntimeError("Expected tool call but model did not return one.")
         return SimpleNamespace(arguments=None, response="")
+
+
+class QuerierThread:
+    def __init__(self, querier, system_context=None, history_rounds=THREAD_HISTORY_ROUNDS):
+        self.querier = querier
+        self.messages = [{"role": "system", "content": querier.system_prompt(system_context)}]
+        self.history_rounds = history_rounds
+        self.rounds = 0
+
+    def run(self, client, input, token_budgets=None, cancel_token=None):
+        self.messages.append({"role": "user", "content": input})
+        _record_input(self.querier.name, messages=self.messages)
+        try:
+            result = self.querier.complete(client, self.messages, token_budgets, cancel_token=cancel_token)
+        except Exception:
+            self.messages.pop()
+            raise
+        reply = json.dumps(result.arguments, ensure_ascii=False) if result.arguments is not None else result.response
+        self.messages.append({"role": "assistant", "content": reply or ""})
+        self.rounds += 1
+        del self.messages[1 : -2 * self.history_rounds]
+        return result
@@ -1,7 +1,12 @@
 import atexit
+import hashlib
 import json
 import logging
 import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
 from html import unescape
 from pathlib import Path
 from threading import Lock
@@ -9,6 +14,9 @@ from urllib.parse import parse_qs, unquote, urlparse
 
 import requests
 
+import metrics
+
+from .passages import SECTION_LABEL_PATTERN, estimate_tokens, select_passages, split_stanzas
 from .query import Querier
 
 logger = logging.getLogger("ibis.chat.rag")
@@ -34,7 +42,57 @@ DIV_TOKEN_PATTERN = re.compile(r"</?div\b[^>]*>", flags=re.IGNORECASE)
 BR_PATTERN = re.compile(r"<br\s*/?>", flags=re.IGNORECASE)
 TAG_PATTERN = re.compile(r"<[^>]+>")
 CACHE_LOCK = Lock()
+CACHE_LOADED = False
+CACHE_LOAD_LOCK = Lock()
 LOOKUP_CACHE = {}
+TRANSLATION_CACHE = {}
+STANZA_TRANSLATION_CACHE = {}
+RETRIEVERS = {}
+RETRIEVAL_DEADLINE_SECONDS = 8.0
+RETRIEVAL_EXECUTOR = ThreadPoolExecutor(max_workers=16, thread_name_prefix="retriever")
+LATE_RESULTS_LOCK = Lock()
+LATE_RESULTS = OrderedDict()
+LATE_RESULTS_MAX_KEYS = 256
+LATE_RESULTS_TTL_SECONDS = 300
+TRANSLATION_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="translator")
+WORD_PATTERN = re.compile(r"\w+(?:'\w+)?")
+LATIN_SCRIPT_MAX = 0x24F
+ENGLISH_LINE_RATIO = 0.5
+ENGLISH_LINE_MIN_WORDS = 3
+ENGLISH_WORDS = frozenset(
+    """
+    a about after again all always am an and any are around as at away back bad be because been before being
+    better but by can can't come could cry day did didn't do don't down dream every everything eyes feel find
+    for forever from get give go going gone good got had has have he heart her here hey him his hold home how
+    i i'm i'll i've if in into is isn't it it's just know last leave let life light like little long look love
+    made make me mind more my need never night no not nothing now of oh on one only or our out over please
+    right said say see she should so some something still stay take tell than that that's the their them then
+    there there's these they they're thing think this through time to together tonight too up us wanna want
+    was way we we're were what what's when where while who why will with without won't world would yeah yes
+    you you're your ooh whoa ah help baby
+    """.split()
+)
+FOREIGN_STOPWORDS = {
+    "spanish": frozenset(
+        """
+        de la que el en y los se del las un por con una su para es al lo como más pero sus le ya o porque esta
+        cuando muy sin sobre también me hasta hay donde quien desde todo nos ni eso yo mi mis tú te ti tu tus él
+        ella estoy está soy eres quiero amor corazón vida no sé si qué
+        """.split()
+    ),
+    "italian": frozenset(
+        """
+        di che e la il un a per in non una sono mi ho lo ma ti le si io tu come con del della se mio mia tuo
+        tua cosa ci questo quando anche più perché sei amore cuore sempre niente vita tutto
+        """.split()
+    ),
+    "romaji": frozenset(
+        """
+        no wa ga wo o ni de to mo ka na ne yo da desu kimi boku watashi ore anata kokoro ai koi yume sora hoshi
+        kara made dake demo shite iru aru nai naru sou kono sono ano itsumo mada zutto mou
+        """.split()
+    ),
+}
 
 
 def _next_user_agent():
@@ -46,6 +104,7 @@ def _next_user_agent():
 
 
 SONG_TITLE_NER_QUERIER = Querier(
+    name="song_title_ner",
     instructions=(
         "Extract all song titles mentioned anywhere in the provided full context when highly confident. "
         "Treat romanized/transliterated titles, including lowercase multi-word phrases, as valid song titles when likely."
@@ -72,6 +131,7 @@ SONG_TITLE_NER_QUERIER = Querier(
 )
 
 SONG_TITLE_VERIFIER_QUERIER = Querier(
+    name="song_title_verifier",
     instructions=(
         "Decide if candidate_text should be treated as a song title in this user message context. "
         "Be conservative: reject casual slang, memes, or ordinary phrases unless context clearly "
@@ -96,25 +156,52 @@ SONG_TITLE_VERIFIER_QUERIER = Querier(
 )
 
 TRANSLATE_LYRICS_QUERIER = Querier(
+    name="translate_lyrics",
     instructions=(
-        "Translate song lyrics to English. Preserve line breaks and section labels when possible. "
+        "Translate song lyrics to English, one output line per input line. "
+        "Preserve line breaks and section labels when possible. "
         "Return only the translated lyrics text."
     ),
     temperature=0.0,
     token_budgets=[600, 1200],
 )
 
-def _load_cache():
-    global LOOKUP_CACHE
+def _read_cache_file():
     if not CACHE_PATH.exists():
-        LOOKUP_CACHE = {}
-        return
-    LOOKUP_CACHE = json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+        return {}, {}, {}
+    data = json.loads(CACHE_PATH.read_text(encoding="utf-8"))
+    if isinstance(data.get("lyrics"), dict) and isinstance(data.get("translations"), dict):
+        return data["lyrics"], data["translations"], data.get("stanza_translations", {})
+    return data, {}, {}
+
+
+def _load_cache():
+    global LOOKUP_CACHE, TRANSLATION_CACHE, STANZA_TRANSLATION_CACHE, CACHE_LOADED
+    lyrics, translations, stanza_translations = _read_cache_file()
+    with CACHE_LOCK:
+        LOOKUP_CACHE = {**lyrics, **LOOKUP_CACHE}
+        TRANSLATION_CACHE = {**translations, **TRANSLATION_CACHE}
+        STANZA_TRANSLATION_CACHE = {**stanza_translations, **STANZA_TRANSLATION_CACHE}
+        CACHE_LOADED = True
+
+
+def ensure_cache_loaded():
+    if not CACHE_LOADED:
+        with CACHE_LOAD_LOCK:
+            if not CACHE_LOADED:
+                _load_cache()
 
 
 def _save_cache():
+    if not LOOKUP_CACHE and not TRANSLATION_CACHE and not STANZA_TRANSLATION_CACHE:
+        return
+    on_disk_lyrics, on_disk_translations, on_disk_stanzas = _read_cache_file()
     with CACHE_LOCK:
-        snapshot = dict(LOOKUP_CACHE)
+        snapshot = {
+            "lyrics": {**on_disk_lyrics, **LOOKUP_CACHE},
+            "translations": {**on_disk_translations, **TRANSLATION_CACHE},
+            "stanza_translations": {**on_disk_stanzas, **STANZA_TRANSLATION_CACHE},
+        }
     CACHE_PATH.write_text(
         json.dumps(snapshot, ensure_ascii=False, indent=2, sort_keys=True),
         encoding="utf-8",
@@ -124,6 +211,7 @@ def _save_cache():
 def _lookup_title_lyrics(title):
     user_agent = _next_user_agent()
     cache_key = title.casefold()
+    ensure_cache_loaded()
     with CACHE_LOCK:
         if cache_key in LOOKUP_CACHE and LOOKUP_CACHE[cache_key]:
             return {"title": title, "lyrics": LOOKUP_CACHE[cache_key]}
@@ -199,16 +287,112 @@ def _lookup_title_lyrics(title):
     return {"title": title, "lyrics": lyrics}
 
 
-def _translate_lyrics_to_english(client, title, lyrics):
+def _language_scores(text):
+    words = WORD_PATTERN.findall(text.casefold())
+    english = sum(word in ENGLISH_WORDS for word in words)
+    foreign = max(sum(word in stopwords for word in words) for stopwords in FOREIGN_STOPWORDS.values())
+    return words, english, foreign
+
+
+def _is_english_line(line):
+    if SECTION_LABEL_PATTERN.match(line):
+        return True
+    if any(char.isalpha() and ord(char) > LATIN_SCRIPT_MAX for char in line):
+        return False
+    words, english, foreign = _language_scores(line)
+    if not words:
+        return True
+    if len(words) < ENGLISH_LINE_MIN_WORDS:
+        return None
+    return english > foreign and english / len(words) >= ENGLISH_LINE_RATIO
+
+
+def _english_lines(lines):
+    verdicts = [_is_english_line(line) if line.strip() else True for line in lines]
+    decided = [verdict for line, verdict in zip(lines, verdicts) if line.strip() and verdict is not None]
+    if decided:
+        majority = 2 * sum(decided) >= len(decided)
+    else:
+        _, english, foreign = _language_scores(" ".join(lines))
+        majority = english >= foreign
+    return [majority if verdict is None else verdict for verdict in verdicts]
+
+
+def _run_translation(client, title, lyrics):
+    metrics.incr("translation.calls")
     translation = TRANSLATE_LYRICS_QUERIER.run(
         client=client,
         system_context={"title": title},
         input=lyrics,
-        token_budgets=[800, 1400],
+        token_budgets=[300, 600],
     ).response
     return (translation or "").strip() or lyrics
 
 
+def _stanza_key(lines):
+    normalized = "\n".join(" ".join(line.casefold().split()) for line in lines)
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()
+
+
+def _translate_stanza(client, title, lyrics):
+    lines = lyrics.splitlines()
+    english_lines = _english_lines(lines)
+    foreign = [index for index, line in enumerate(lines) if line.strip() and not english_lines[index]]
+    if not foreign:
+        metrics.incr("translation.calls_saved")
+        metrics.incr("translation.lines_skipped", len(lines))
+        metrics.incr("translation.tokens_saved", 2 * estimate_tokens(lyrics))
+        return lyrics
+    content_lines = sum(1 for line in lines if line.strip())
+    if len(foreign) < content_lines:
+        source = "\n".join(lines[index] for index in foreign)
+        translated = [line for line in _run_translation(client, title, source).splitlines() if line.strip()]
+        if len(translated) == len(foreign):
+            foreign_set = set(foreign)
+            english = "\n".join(line for index, line in enumerate(lines) if index not in foreign_set)
+            metrics.incr("translation.lines_skipped", len(lines) - len(foreign))
+            metrics.incr("translation.lines_translated", len(foreign))
+            metrics.incr("translation.tokens_saved", 2 * estimate_tokens(english))
+            for index, line in zip(foreign, translated):
+                lines[index] = line
+            return "\n".join(lines)
+        logger.info("Line-count mismatch translating mixed lyrics for title=%s; translating the whole stanza", title)
+    metrics.incr("translation.lines_translated", content_lines)
+    return _run_translation(client, title, lyrics)
+
+
+def _translate_lyrics_to_english(client, title, lyrics):
+    stanzas = []
+    for stanza in split_stanzas(lyrics):
+        lines = stanza.splitlines()
+        label = lines[0] if SECTION_LABEL_PATTERN.match(lines[0]) else None
+        body = lines[1:] if label else lines
+        stanzas.append((label, body, _stanza_key(body)))
+    unique = {}
+    for _, body, key in stanzas:
+        if body:
+            unique.setdefault(key, body)
+    with CACHE_LOCK:
+        translated = {key: STANZA_TRANSLATION_CACHE[key] for key in unique if key in STANZA_TRANSLATION_CACHE}
+    metrics.incr("translation.stanzas", len(stanzas))
+    metrics.incr("translation.stanzas_deduped", sum(1 for _, body, _ in stanzas if body) - len(unique))
+    metrics.incr("translation.stanza_cache_hits", len(translated))
+    futures = {
+        key: TRANSLATION_EXECUTOR.submit(_translate_stanza, client, title, "\n".join(body))
+        for key, body in unique.items()
+        if key not in translated
+    }
+    for key, future in futures.items():
+        translated[key] = future.result()
+        if translated[key] != "\n".join(unique[key]):
+            with CACHE_LOCK:
+                STANZA_TRANSLATION_CACHE[key] = translated[key]
+    parts = []
+    for label, body, key in stanzas:
+        parts.append("\n".join(([label] if label else []) + ([translated[key]] if body else [])))
+    return "\n\n".join(parts)
+
+
 def _normalize_full_context(full_context):
     if isinstance(full_context, dict):
         normalized = dict(full_context)
@@ -254,47 +438,176 @@ def _build_ner_corpus(full_context):
     return "\n".join(parts)
 
 
-def lookup_key_text_context(client, full_context):
-    try:
-        full_context = _normalize_full_context(full_context)
-        ner_corpus = _build_ner_corpus(full_context)
-        model_args = SONG_TITLE_NER_QUERIER.run(
+def _build_passage_query(full_context):
+    parts = [str(full_context.get("input_text", "")).strip()]
+    for msg in full_context.get("recent_messages", []) or []:
+        if isinstance(msg, dict):
+            parts.append(str(msg.get("content", msg.get("text", ""))).strip())
+        else:
+            parts.append(str(msg).strip())
+    return "\n".join(part for part in parts if part)
+
+
+def register_retriever(extractor, name=None):
+    def decorator(fetcher):
+        RETRIEVERS[name or fetcher.__name__] = {"extractor": extractor, "fetcher": fetcher}
+        return fetcher
+
+    return decorator
+
+
+def _extract_song_titles(client, full_context):
+    ner_corpus = _build_ner_corpus(full_context)
+    model_args = SONG_TITLE_NER_QUERIER.run(
+        client=client,
+        system_context={"task": "song_title_ner", "full_context": full_context},
+        input=ner_corpus,
+    ).arguments
+    possible = []
+    for item in model_args["possible_song_titles"]:
+        title = re.sub(r"\s+", " ", str(item).strip().lower())
+        if not title:
+            continue
+        verdict = SONG_TITLE_VERIFIER_QUERIER.run(
             client=client,
-            system_context={"task": "song_title_ner", "full_context": full_context},
-            input=ner_corpus,
+            system_context={"message_text": ner_corpus, "candidate_text": title, "full_context": full_context},
+            input=title,
         ).arguments
-        possible = []
-        for item in model_args["possible_song_titles"]:
-            title = re.sub(r"\s+", " ", str(item).strip().lower())
-            if not title:
-                continue
-            verdict = SONG_TITLE_VERIFIER_QUERIER.run(
-                client=client,
-                system_context={"message_text": ner_corpus, "candidate_text": title, "full_context": full_context},
-                input=title,
-            ).arguments
-            if verdict["is_song_title"]:
-                possible.append(title)
-
-        logger.info("Lookup song title candidates: %s", possible)
-        result_payload = {}
-        for title in possible:
+        if verdict["is_song_title"]:
+            possible.append(title)
+    logger.info("Lookup song title candidates: %s", possible)
+    return possible
+
+
+@register_retriever(extractor=_extract_song_titles, name="song_lyrics")
+def _fetch_song_lyrics(client, title, full_context):
+    cache_key = title.casefold()
+    ensure_cache_loaded()
+    with CACHE_LOCK:
+        if TRANSLATION_CACHE.get(cache_key):
+            return TRANSLATION_CACHE[cache_key]
+    result = _lookup_title_lyrics(title)
+    lyrics = result["lyrics"]
+    if not lyrics:
+        return ""
+    lyrics = _translate_lyrics_to_english(client, result["title"], lyrics)
+    with CACHE_LOCK:
+        TRANSLATION_CACHE[cache_key] = lyrics
+    return lyrics
+
+
+def _store_late_result(late_key, source, key, future):
+    try:
+        text = future.result()
+    except Exception:
+        logger.exception("Late retrieval failed for source=%s key=%s", source, key)
+        return
+    logger.info("Late retrieval arrived for source=%s key=%s", source, key)
+    if not text or late_key is None:
+        return
+    with LATE_RESULTS_LOCK:
+        LATE_RESULTS.setdefault(late_key, {})[(source, key)] = (text, time.monotonic())
+        LATE_RESULTS.move_to_end(late_key)
+        while len(LATE_RESULTS) > LATE_RESULTS_MAX_KEYS:
+            LATE_RESULTS.popitem(last=False)
+
+
+def peek_late_results(late_key):
+    if late_key is None:
+        return {}
+    expire_before = time.monotonic() - LATE_RESULTS_TTL_SECONDS
+    with LATE_RESULTS_LOCK:
+        entries = LATE_RESULTS.get(late_key, {})
+        for item, (_, stored_at) in list(entries.items()):
+            if stored_at < expire_before:
+                del entries[item]
+        if not entries:
+            LATE_RESULTS.pop(late_key, None)
+        return dict(entries)
+
+
+def discard_late_results(late_key, results):
+    if not results:
+        return
+    with LATE_RESULTS_LOCK:
+        entries = LATE_RESULTS.get(late_key, {})
+        for item, stored in results.items():
+            if entries.get(item) == stored:
+                del entries[item]
+        if not entries:
+            LATE_RESULTS.pop(late_key, None)
+
+
+def _submit_fetches(client, source, keys, full_context, late_key=None):
+    fetcher = RETRIEVERS[source]["fetcher"]
+    futures = {}
+    for key in dict.fromkeys(keys):
+        future = RETRIEVAL_EXECUTOR.submit(fetcher, client, key, full_context)
+        if late_key is not None:
+            future.add_done_callback(partial(_store_late_result, late_key, source, key))
+        futures[future] = (source, key)
+    return futures
+
+
+def _fetch_after_late_extraction(client, source, full_context, late_key, future):
+    try:
+        keys = future.result()
+    except Exception:
+        logger.exception("Late retrieval extraction failed for source=%s", source)
+        return
+    _submit_fetches(client, source, keys, full_context, late_key=late_key)
+
+
+def lookup_key_text_context(
+    client, full_context, deadline=RETRIEVAL_DEADLINE_SECONDS, late_key=None, late_results=None
+):
+    try:
+        full_context = _normalize_full_context(full_context)
+        deadline_at = time.monotonic() + deadline
+        documents = {}
+        for (source, key), (text, _) in (late_results or {}).items():
+            documents.setdefault(source, {})[key] = text
+
+        extract_futures = {
+            RETRIEVAL_EXECUTOR.submit(retriever["extractor"], client, full_context): source
+            for source, retriever in RETRIEVERS.items()
+        }
+        done, pending = wait(extract_futures, timeout=max(0.0, deadline_at - time.monotonic()))
+        fetch_futures = {}
+        for future in done:
+            source = extract_futures[future]
             try:
-                result = _lookup_title_lyrics(title)
-                lyrics = result["lyrics"]
-                if lyrics:
-                    lyrics = _translate_lyrics_to_english(client, result["title"], lyrics)
-                    with CACHE_LOCK:
-                        LOOKUP_CACHE[result["title"].casefold()] = lyrics
-                    result_payload[result["title"]] = lyrics
+                fetch_futures.update(_submit_fetches(client, source, future.result(), full_context))
             except Exception:
-                logger.exception("Song lookup failed for title=%s", title)
+                logger.exception("Retriever extraction failed for source=%s", source)
+        for future in pending:
+            source = extract_futures[future]
+            logger.info("Retriever %s missed the deadline during extraction.", source)
+            future.add_done_callback(partial(_fetch_after_late_extraction, client, source, full_context, late_key))
 
+        done, pending = wait(fetch_futures, timeout=max(0.0, deadline_at - time.monotonic()))
+        for future in done:
+            source, key = fetch_futures[future]
+            try:
+                text = future.result()
+            except Exception:
+                logger.exception("Retriever fetch failed for source=%s key=%s", source, key)
+                continue
+            if text:
+                documents.setdefault(source, {})[key] = text
+        for future in pending:
+            source, key = fetch_futures[future]
+            logger.info("Retriever %s missed the deadline for key=%s.", source, key)
+            future.add_done_callback(partial(_store_late_result, late_key, source, key))
+
+        flattened = {(source, key): text for source, items in documents.items() for key, text in items.items()}
+        result_payload = {}
+        for (source, key), text in select_passages(flattened, _build_passage_query(full_context)).items():
+            result_payload.setdefault(source, {})[key] = text
         return result_payload
     except Exception:
         logger.exception("Retrieved-context lookup failed; continuing without retrieved context.")
         return {}
 
 
-_load_cache()
 atexit.register(_save_cache)
@@ -0,0 +1,134 @@
+import argparse
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+
+import chat
+import data_models
+from chat import rag
+
+logger = logging.getLogger("ibis.chat.warm_cache")
+PROGRESS_PATH = Path("chat/warm_cache_progress.json")
+SAVE_EVERY = 10
+
+
+def _load_progress(path):
+    if not path.exists():
+        return {"done": [], "failed": []}
+    return json.loads(path.read_text(encoding="utf-8"))
+
+
+def _save_progress(path, progress):
+    path.write_text(json.dumps(progress, ensure_ascii=False, indent=2, sort_keys=True), encoding="utf-8")
+
+
+def _normalize_title(title):
+    return " ".join(str(title).strip().lower().split())
+
+
+def _read_titles_file(path):
+    return [line for line in Path(path).read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def _mine_titles(client, concurrency):
+    contexts = []
+    with data_models.Session() as session:
+        for summary in session.query(data_models.User.conversation_summary):
+            if summary[0]:
+                contexts.append({"input_text": "", "user": {"conversation_summary": summary[0]}})
+        for content in session.query(data_models.GlobalMemory.content):
+            if content[0]:
+                contexts.append({"input_text": "", "global_memory": content[0]})
+
+    titles = []
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(rag._extract_song_titles, client, ctx) for ctx in contexts]
+        for future in as_completed(futures):
+            try:
+                titles.extend(future.result())
+            except Exception:
+                logger.exception("Title mining failed for one stored context.")
+    return titles
+
+
+def warm_titles(client, titles, concurrency=4, progress_path=PROGRESS_PATH, retry_failed=False):
+    progress = _load_progress(progress_path)
+    done = set(progress["done"])
+    failed = set(progress["failed"])
+    skip = done if retry_failed else done | failed
+    rag.ensure_cache_loaded()
+    pending = []
+    for title in dict.fromkeys(_normalize_title(t) for t in titles):
+        if not title or title in skip:
+            continue
+        with rag.CACHE_LOCK:
+            if rag.TRANSLATION_CACHE.get(title.casefold()):
+                done.add(title)
+                continue
+        pending.append(title)
+    logger.info("Warming %d titles (%d already done).", len(pending), len(done))
+
+    completed = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(rag._fetch_song_lyrics, client, title, {}): title for title in pending}
+        for future in as_completed(futures):
+            title = futures[future]
+            try:
+                lyrics = future.result()
+            except Exception:
+                logger.exception("Warming failed for title=%s", title)
+                lyrics = ""
+            if lyrics:
+                done.add(title)
+                failed.discard(title)
+            else:
+                failed.add(title)
+            completed += 1
+            logger.info("[%d/%d] %s %s", completed, len(pending), "warmed" if lyrics else "missed", title)
+            if completed % SAVE_EVERY == 0:
+                rag._save_cache()
+                _save_progress(progress_path, {"done": sorted(done), "failed": sorted(failed)})
+
+    rag._save_cache()
+    _save_progress(progress_path, {"done": sorted(done), "failed": sorted(failed)})
+    return {"done": len(done), "failed": len(failed)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-fetch and translate song lyrics into the lyrics cache.")
+    parser.add_argument("titles", nargs="*", help="Song titles to warm.")
+    parser.add_argument("--titles-file", help="File with one song title per line.")
+    parser.add_argument("--from-db", action="store_true", help="Mine titles from stored summaries and global memory.")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--progress", default=str(PROGRESS_PATH), help="Progress file used to resume runs.")
+    parser.add_argument("--retry-failed", action="store_true", help="Retry titles that previously found no lyrics.")
+    parser.add_argument("--keyring", default="keyring.json")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    with open(args.keyring, "r", encoding="utf-8") as f:
+        keyring = json.load(f)
+    chat.initialize_connection(keyring)
+
+    titles = list(args.titles)
+    if args.titles_file:
+        titles.extend(_read_titles_file(args.titles_file))
+    if args.from_db:
+        data_models.initialize_connection(keyring["db_url"])
+        titles.extend(_mine_titles(chat.get_client(), args.concurrency))
+    if not titles:
+        parser.error("no titles given; pass titles, --titles-file, or --from-db")
+
+    result = warm_titles(
+        chat.get_client(),
+        titles,
+        concurrency=args.concurrency,
+        progress_path=Path(args.progress),
+        retry_failed=args.retry_failed,
+    )
+    logger.info("Cache warming finished: %s", result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import traceback
+from collections import defaultdict
+from types import SimpleNamespace
+
+import chat
+import data_models
+import goal_management  # noqa: F401
+import metrics
+import turns
+from turn_queue import TurnQueue
+
+logger = logging.getLogger("ibis.worker")
+GUILD_LOCKS = defaultdict(asyncio.Lock)
+IN_FLIGHT = 0
+
+
+async def run_job(payload):
+    discord_user = SimpleNamespace(id=payload["user_id"], display_name=payload["display_name"])
+    server_key = payload["server_key"]
+    memory_lane = GUILD_LOCKS[server_key] if server_key else None
+    if payload["kind"] == "summary_flush":
+        await turns.flush_pending_turns(
+            payload["user_id"], payload["display_name"], server_key, memory_lane=memory_lane, lock_memory=True
+        )
+        return ""
+    return await turns.run_turn(
+        discord_user,
+        server_key,
+        payload["text"],
+        payload.get("recent_messages"),
+        memory_lane=memory_lane,
+        lock_memory=True,
+        channel_id=payload.get("channel_id"),
+    )
+
+
+async def work(queue, worker_id, poll_seconds):
+    global IN_FLIGHT
+    while True:
+        job = await asyncio.to_thread(queue.claim, worker_id)
+        if job is None:
+            await asyncio.sleep(poll_seconds)
+            continue
+        job_id, payload, waited = job
+        metrics.observe("worker.wait_seconds", waited)
+        chat.DEGRADATION.observe("queue_wait", waited)
+        IN_FLIGHT += 1
+        chat.DEGRADATION.set_in_flight(IN_FLIGHT)
+        try:
+            reply_text = await run_job(payload)
+        except Exception:
+            logger.exception("Turn job %s failed.", job_id)
+            await asyncio.to_thread(queue.fail, job_id, traceback.format_exc())
+            metrics.incr("worker.failed")
+            continue
+        finally:
+            IN_FLIGHT -= 1
+            chat.DEGRADATION.set_in_flight(IN_FLIGHT)
+        await asyncio.to_thread(queue.complete, job_id, reply_text)
+        metrics.incr("worker.completed")
+
+
+async def serve(keyring, concurrency, poll_seconds):
+    data_models.initialize_connection(
+        keyring["db_url"],
+        pool_size=keyring.get("db_pool_size", 5),
+        max_overflow=keyring.get("db_max_overflow", 10),
+        use_async=True,
+    )
+    data_models.configure_caches(0, 0)
+    if data_models.engine.dialect.name == "sqlite":
+        logger.warning("SQLite cannot lock guild memory rows; run one worker process or use a server database.")
+    chat.initialize_connection(keyring)
+    chat.DEGRADATION.configure(concurrency=concurrency)
+    turns.configure(keyring)
+    queue = TurnQueue(keyring["turn_queue_path"])
+    worker_id = f"{os.uname().nodename}:{os.getpid()}"
+    logger.info("Chat worker %s started with concurrency=%d.", worker_id, concurrency)
+    await asyncio.gather(*(work(queue, f"{worker_id}:{slot}", poll_seconds) for slot in range(concurrency)))
+
+
+def run_process(keyring, concurrency, poll_seconds):
+    logging.basicConfig(
+        level=logging.CRITICAL,
+        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
+        datefmt="%H:%M:%S",
+    )
+    logging.getLogger("ibis.worker").setLevel(logging.INFO)
+    asyncio.run(serve(keyring, concurrency, poll_seconds))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run chat worker processes that serve turns queued by the gateway.")
+    parser.add_argument("--keyring", default="keyring.json")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=4, help="Concurrent turns per process.")
+    parser.add_argument("--poll-seconds", type=float, default=0.2)
+    args = parser.parse_args(argv)
+
+    with open(args.keyring, "r", encoding="utf-8") as f:
+        keyring = json.load(f)
+    if args.processes == 1:
+        run_process(keyring, args.concurrency, args.poll_seconds)
+        return
+    processes = [
+        multiprocessing.Process(target=run_process, args=(keyring, args.concurrency, args.poll_seconds))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
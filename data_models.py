@@ -1,4 +1,9 @@
+import asyncio
+import logging
+import re
+from collections import OrderedDict
 from datetime import datetime, timezone
+from threading import Lock
 
 from sqlalchemy import (
     BigInteger,
@@ -7,18 +12,81 @@ from sqlalchemy import (
     DateTime,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     String,
     Text,
     create_engine,
+    delete,
+    func,
+    insert,
+    literal_column,
+    or_,
+    select,
     text,
+    update,
 )
 from sqlalchemy import inspect
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.sql import column, table
 
+import metrics
+
+logger = logging.getLogger("ibis.data_models")
 Base = declarative_base()
 engine = None
 Session = None
+async_engine = None
+AsyncSession = None
+SCHEMA_READY = False
+SCHEMA_LOCK = Lock()
+OPEN_TASK_LIMIT = 25
+TASK_CONTEXT_LIMIT = 5
+TASK_SEARCH_LIMIT = 5
+TASK_SEARCH = None
+SEARCH_TOKEN_PATTERN = re.compile(r"\w+")
+TASKS_FTS = table("tasks_fts", column("rowid"))
+TASK_SEARCH_VECTOR = literal_column(
+    "to_tsvector('simple', coalesce(tasks.description, '') || ' ' || coalesce(tasks.progress, ''))"
+)
+SQLITE_TASK_FTS_DDL = [
+    "CREATE VIRTUAL TABLE tasks_fts USING fts5(description, progress, content='tasks', content_rowid='task_id')",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_insert AFTER INSERT ON tasks BEGIN "
+    "INSERT INTO tasks_fts(rowid, description, progress) VALUES (new.task_id, new.description, new.progress); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_delete AFTER DELETE ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, description, progress) "
+    "VALUES ('delete', old.task_id, old.description, old.progress); END",
+    "CREATE TRIGGER IF NOT EXISTS tasks_fts_update AFTER UPDATE OF description, progress ON tasks BEGIN "
+    "INSERT INTO tasks_fts(tasks_fts, rowid, description, progress) "
+    "VALUES ('delete', old.task_id, old.description, old.progress); "
+    "INSERT INTO tasks_fts(rowid, description, progress) VALUES (new.task_id, new.description, new.progress); END",
+    "INSERT INTO tasks_fts(tasks_fts) VALUES ('rebuild')",
+]
+POSTGRES_TASK_SEARCH_DDL = (
+    "CREATE INDEX IF NOT EXISTS ix_tasks_search ON tasks USING gin "
+    "(to_tsvector('simple', coalesce(description, '') || ' ' || coalesce(progress, '')))"
+)
+ARCHIVE_BATCH_SIZE = 500
+TASK_BATCH_SIZE = 500
+TASK_COLUMN_MIGRATIONS = {
+    "remind_at": "TIMESTAMP",
+    "reminded_at": "TIMESTAMP",
+    "last_reset_at": "TIMESTAMP",
+}
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+}
+
+
+def utcnow():
+    return datetime.now(timezone.utc).replace(tzinfo=None)
 
 
 class GlobalMemory(Base):
@@ -56,25 +124,7 @@ class User(Base):
     tasks = relationship("Task", cascade="all, delete-orphan")
     like_items = relationship("UserLike", cascade="all, delete-orphan", lazy="joined")
     dislike_items = relationship("UserDislike", cascade="all, delete-orphan", lazy="joined")
-
-    @classmethod
-    def ensure_user(cls, discord_user, session=None):
-        if session is None:
-            with Session() as owned_session:
-                user = cls(
-                    discord_id=discord_user.id,
-                    name=discord_user.display_name,
-                )
-                user = owned_session.merge(user)
-                owned_session.commit()
-                return user.discord_id
-        user = cls(
-            discord_id=discord_user.id,
-            name=discord_user.display_name,
-        )
-        user = session.merge(user)
-        session.commit()
-        return user.discord_id
+    pending_turns = relationship("PendingTurn", cascade="all, delete-orphan", order_by="PendingTurn.turn_id")
 
     def to_jsonable(self):
         likes_list = [item.value for item in self.like_items]
@@ -91,29 +141,34 @@ class User(Base):
                 "occupation": self.occupation,
             },
             "conversation_summary": self.conversation_summary,
-            "tasks": [task.to_dict() for task in self.tasks if not task.completed],
+            "tasks": [task.to_dict() for task in self.tasks if not task.completed][-TASK_CONTEXT_LIMIT:],
         }
 
     def update_profile(self, profile):
         for key in ["name", "gender", "height", "sexuality", "occupation"]:
-            if key in profile:
+            if key in profile and getattr(self, key) != profile[key]:
                 setattr(self, key, profile[key])
 
         if "likes" in profile:
-            self.like_items.clear()
-            likes_val = profile["likes"] or []
-            for val in likes_val:
-                self.like_items.append(UserLike(user_id=self.discord_id, value=val))
+            self._sync_values(self.like_items, UserLike, profile["likes"])
 
         if "dislikes" in profile:
-            self.dislike_items.clear()
-            dislikes_val = profile["dislikes"] or []
-            for val in dislikes_val:
-                self.dislike_items.append(UserDislike(user_id=self.discord_id, value=val))
+            self._sync_values(self.dislike_items, UserDislike, profile["dislikes"])
+
+    def _sync_values(self, items, item_cls, values):
+        wanted = dict.fromkeys(val for val in values or [] if val)
+        for item in [item for item in items if item.value not in wanted]:
+            items.remove(item)
+        existing = {item.value for item in items}
+        items.extend(item_cls(user_id=self.discord_id, value=val) for val in wanted if val not in existing)
 
 
 class Task(Base):
     __tablename__ = "tasks"
+    __table_args__ = (
+        Index("ix_tasks_user_id_completed", "user_id", "completed", "created_at"),
+        Index("ix_tasks_remind_at", "remind_at"),
+    )
 
     task_id = Column(Integer, primary_key=True)
     task_type = Column(Enum("goal", "daily", "one_off", name="task_type"), nullable=False)
@@ -121,7 +176,10 @@ class Task(Base):
     due_text = Column(String, nullable=True)  # fuzzy timing or None
     progress = Column(String, nullable=True)  # user-entered progress notes
     completed = Column(Boolean, default=False, nullable=False)
-    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc), nullable=False)
+    created_at = Column(DateTime, default=utcnow, nullable=False)
+    remind_at = Column(DateTime, nullable=True)  # UTC, naive
+    reminded_at = Column(DateTime, nullable=True)
+    last_reset_at = Column(DateTime, nullable=True)  # daily tasks only
     user_id = Column(BigInteger, ForeignKey("users.discord_id"), nullable=True)
 
     def to_dict(self):
@@ -132,11 +190,508 @@ class Task(Base):
             "due_text": self.due_text,
             "progress": self.progress,
             "completed": self.completed,
+            "remind_at": self.remind_at.isoformat(timespec="minutes") if self.remind_at else None,
         }
 
 
-def initialize_connection(db_url: str):
-    global engine, Session
+class PendingTurn(Base):
+    __tablename__ = "pending_turns"
+    __table_args__ = (Index("ix_pending_turns_user_id_server_key", "user_id", "server_key", "turn_id"),)
+
+    turn_id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, ForeignKey("users.discord_id"), nullable=False)
+    server_key = Column(String, nullable=True)
+    turn_text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=utcnow, nullable=False)
+
+
+class TurnHistory(Base):
+    __tablename__ = "turn_history"
+    __table_args__ = (Index("ix_turn_history_user_id_turn_id", "user_id", "turn_id"),)
+
+    turn_id = Column(Integer, primary_key=True)
+    user_id = Column(BigInteger, ForeignKey("users.discord_id"), nullable=False)
+    server_key = Column(String, nullable=True)
+    turn_text = Column(Text, nullable=False)
+    created_at = Column(DateTime, default=utcnow, nullable=False)
+
+
+class TaskArchive(Base):
+    __tablename__ = "tasks_archive"
+
+    task_id = Column(Integer, primary_key=True)
+    task_type = Column(Enum("goal", "daily", "one_off", name="task_type"), nullable=False)
+    description = Column(String, nullable=False)
+    due_text = Column(String, nullable=True)
+    progress = Column(String, nullable=True)
+    completed = Column(Boolean, default=True, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    archived_at = Column(DateTime, default=utcnow, nullable=False)
+    user_id = Column(BigInteger, ForeignKey("users.discord_id"), nullable=True, index=True)
+
+
+async def archive_completed_tasks(batch_size=ARCHIVE_BATCH_SIZE):
+    await ensure_schema_async()
+    columns = ["task_id", "task_type", "description", "due_text", "progress", "completed", "created_at", "user_id"]
+    archived = 0
+    while True:
+        async with AsyncSession() as session:
+            task_ids = (
+                await session.scalars(
+                    select(Task.task_id)
+                    .where(Task.completed.is_(True), Task.task_type != "daily")
+                    .order_by(Task.task_id)
+                    .limit(batch_size)
+                )
+            ).all()
+            if not task_ids:
+                break
+            await session.execute(
+                insert(TaskArchive).from_select(
+                    columns,
+                    select(*(getattr(Task, name) for name in columns)).where(Task.task_id.in_(task_ids)),
+                )
+            )
+            await session.execute(delete(Task).where(Task.task_id.in_(task_ids)))
+            await session.commit()
+        archived += len(task_ids)
+        if len(task_ids) < batch_size:
+            break
+    metrics.incr("tasks.archived", archived)
+    return archived
+
+
+async def reset_daily_tasks(batch_size=TASK_BATCH_SIZE):
+    await ensure_schema_async()
+    now = utcnow()
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    reset = 0
+    while True:
+        async with AsyncSession() as session:
+            rows = (
+                await session.execute(
+                    select(Task.task_id, Task.user_id)
+                    .where(
+                        Task.task_type == "daily",
+                        func.coalesce(Task.last_reset_at, Task.created_at) < day_start,
+                    )
+                    .limit(batch_size)
+                )
+            ).all()
+            if not rows:
+                break
+            await session.execute(
+                update(Task)
+                .where(Task.task_id.in_([row.task_id for row in rows]))
+                .values(completed=False, progress=None, last_reset_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+        for user_id in {row.user_id for row in rows}:
+            USER_CACHE.invalidate(user_id)
+        reset += len(rows)
+        if len(rows) < batch_size:
+            break
+    metrics.incr("tasks.daily_reset", reset)
+    return reset
+
+
+async def claim_due_reminders(batch_size=TASK_BATCH_SIZE):
+    await ensure_schema_async()
+    now = utcnow()
+    async with AsyncSession() as session:
+        rows = (
+            await session.execute(
+                select(Task.task_id, Task.user_id, Task.description)
+                .where(Task.remind_at <= now, Task.reminded_at.is_(None), Task.completed.is_(False))
+                .order_by(Task.remind_at)
+                .limit(batch_size)
+            )
+        ).all()
+        if rows:
+            await session.execute(
+                update(Task)
+                .where(Task.task_id.in_([row.task_id for row in rows]))
+                .values(reminded_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            await session.commit()
+    for user_id in {row.user_id for row in rows}:
+        USER_CACHE.invalidate(user_id)
+    metrics.incr("tasks.reminders_claimed", len(rows))
+    return rows
+
+
+async def idle_pending_turns(idle_before, limit=TASK_BATCH_SIZE):
+    await ensure_schema_async()
+    async with AsyncSession() as session:
+        stmt = (
+            select(PendingTurn.user_id, PendingTurn.server_key, User.name)
+            .join(User, User.discord_id == PendingTurn.user_id)
+            .group_by(PendingTurn.user_id, PendingTurn.server_key, User.name)
+            .having(func.max(PendingTurn.created_at) < idle_before)
+            .limit(limit)
+        )
+        return (await session.execute(stmt)).all()
+
+
+class LRUCache:
+    def __init__(self, name, max_size):
+        self.name = name
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            metrics.incr(f"cache.{self.name}.miss")
+        else:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            metrics.incr(f"cache.{self.name}.hit")
+        metrics.set_gauge(f"cache.{self.name}.hit_rate", self.hit_rate())
+        return entry
+
+    def put(self, key, value, generation=None):
+        if generation is not None and generation != self.generation(key):
+            self.discard(key)
+            metrics.incr(f"cache.{self.name}.stale_put")
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            metrics.incr(f"cache.{self.name}.eviction")
+        metrics.set_gauge(f"cache.{self.name}.size", len(self.entries))
+
+    def discard(self, key):
+        self.entries.pop(key, None)
+        metrics.set_gauge(f"cache.{self.name}.size", len(self.entries))
+
+    def generation(self, key):
+        return self.generations.get(key, 0)
+
+    def invalidate(self, key):
+        self.generations[key] = self.generation(key) + 1
+        self.discard(key)
+
+    def clear(self):
+        self.entries.clear()
+        metrics.set_gauge(f"cache.{self.name}.size", 0)
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+USER_CACHE = LRUCache("user", 1024)
+GLOBAL_MEMORY_CACHE = LRUCache("global_memory", 256)
+
+
+def configure_caches(user_size, global_memory_size):
+    USER_CACHE.max_size = user_size
+    GLOBAL_MEMORY_CACHE.max_size = global_memory_size
+    USER_CACHE.clear()
+    GLOBAL_MEMORY_CACHE.clear()
+
+
+class TurnUnitOfWork:
+    def __init__(self, discord_user, server_key=None):
+        self.discord_user = discord_user
+        self.server_key = server_key
+        self.session = None
+        self.user = None
+        self.global_memory = None
+        self.loaded_task_count = 0
+        self.user_generation = None
+
+    async def __aenter__(self):
+        await ensure_schema_async()
+        self.session = AsyncSession()
+        try:
+            await self._load()
+            await self.session.commit()
+        except BaseException:
+            await self.session.close()
+            raise
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                await self.commit()
+            else:
+                await self.session.rollback()
+                self._invalidate()
+        except BaseException:
+            self._invalidate()
+            raise
+        finally:
+            await self.session.close()
+
+    async def commit(self):
+        await self.session.commit()
+        self._write_through()
+
+    async def end_reads(self):
+        await self.session.commit()
+
+    async def refresh_global_memory(self, lock=False):
+        if self.global_memory is None:
+            return
+        if lock:
+            await self.session.refresh(self.global_memory, with_for_update=True)
+            return
+        cached = GLOBAL_MEMORY_CACHE.get(self.server_key)
+        if cached is not None:
+            set_committed_value(self.global_memory, "content", cached.content)
+        elif inspect(self.global_memory).persistent:
+            await self.session.refresh(self.global_memory)
+
+    async def peek_global_memory(self):
+        if self.global_memory is None:
+            return None
+        cached = GLOBAL_MEMORY_CACHE.get(self.server_key)
+        if cached is not None:
+            return cached.content
+        async with AsyncSession() as session:
+            content = await session.scalar(select(GlobalMemory.content).where(GlobalMemory.key == self.server_key))
+        return content if content is not None else self.global_memory.content
+
+    def _write_through(self):
+        open_tasks = [task for task in self.user.tasks if not task.completed]
+        if self.loaded_task_count >= OPEN_TASK_LIMIT and len(open_tasks) < OPEN_TASK_LIMIT:
+            USER_CACHE.discard(self.user.discord_id)
+        else:
+            set_committed_value(self.user, "tasks", open_tasks[-OPEN_TASK_LIMIT:])
+            USER_CACHE.put(self.user.discord_id, self.user, self.user_generation)
+        if self.global_memory is not None:
+            GLOBAL_MEMORY_CACHE.put(self.server_key, self.global_memory)
+
+    def _invalidate(self):
+        USER_CACHE.discard(self.discord_user.id)
+        if self.server_key is not None:
+            GLOBAL_MEMORY_CACHE.discard(self.server_key)
+
+    async def _load(self):
+        discord_id = self.discord_user.id
+        self.user_generation = USER_CACHE.generation(discord_id)
+        cached_user = USER_CACHE.get(discord_id)
+        cached_gm = GLOBAL_MEMORY_CACHE.get(self.server_key) if self.server_key is not None else None
+        if cached_gm is not None:
+            self.global_memory = await self.session.merge(cached_gm, load=False)
+        if cached_user is not None:
+            self.user = await self.session.merge(cached_user, load=False)
+            self.loaded_task_count = len(self.user.tasks)
+            self._refresh_name()
+            if self.server_key is not None and self.global_memory is None:
+                self.global_memory = await self.session.get(GlobalMemory, self.server_key)
+            self._ensure_global_memory()
+            return
+
+        stmt = select(User).where(User.discord_id == discord_id)
+        join_gm = self.server_key is not None and self.global_memory is None
+        if join_gm:
+            stmt = stmt.add_columns(GlobalMemory).outerjoin(GlobalMemory, GlobalMemory.key == self.server_key)
+        row = (await self.session.execute(stmt)).unique().first()
+
+        if row is None:
+            self.user = User(
+                discord_id=discord_id,
+                name=self.discord_user.display_name,
+                tasks=[],
+                like_items=[],
+                dislike_items=[],
+                pending_turns=[],
+            )
+            self.session.add(self.user)
+            if join_gm:
+                self.global_memory = await self.session.get(GlobalMemory, self.server_key)
+        else:
+            self.user = row[0]
+            self._refresh_name()
+            if join_gm:
+                self.global_memory = row[1]
+            await self._load_open_tasks()
+            await self._load_pending_turns()
+        self._ensure_global_memory()
+
+    async def _load_open_tasks(self):
+        stmt = (
+            select(Task)
+            .where(Task.user_id == self.user.discord_id, Task.completed.is_(False))
+            .order_by(Task.created_at.desc(), Task.task_id.desc())
+            .limit(OPEN_TASK_LIMIT)
+        )
+        tasks = list(reversed((await self.session.scalars(stmt)).all()))
+        set_committed_value(self.user, "tasks", tasks)
+        self.loaded_task_count = len(tasks)
+
+    async def _load_pending_turns(self):
+        stmt = select(PendingTurn).where(PendingTurn.user_id == self.user.discord_id).order_by(PendingTurn.turn_id)
+        set_committed_value(self.user, "pending_turns", list((await self.session.scalars(stmt)).all()))
+
+    @property
+    def pending_turns(self):
+        return [turn for turn in self.user.pending_turns if turn.server_key == self.server_key]
+
+    def add_pending_turn(self, turn_text):
+        self.user.pending_turns.append(PendingTurn(server_key=self.server_key, turn_text=turn_text))
+
+    async def consume_pending_turns(self, turns):
+        turn_ids = {turn.turn_id for turn in turns}
+        if not turn_ids:
+            return
+        await self.session.execute(
+            delete(PendingTurn)
+            .where(PendingTurn.turn_id.in_(turn_ids))
+            .execution_options(synchronize_session=False)
+        )
+        remaining = [turn for turn in self.user.pending_turns if turn.turn_id not in turn_ids]
+        set_committed_value(self.user, "pending_turns", remaining)
+        for turn in turns:
+            self.session.expunge(turn)
+
+    def record_turn(self, turn_text):
+        turn = TurnHistory(user_id=self.user.discord_id, server_key=self.server_key, turn_text=turn_text)
+        self.session.add(turn)
+        return turn
+
+    async def load_turn_history(self, turn_ids):
+        if not turn_ids:
+            return []
+        stmt = select(TurnHistory).where(
+            TurnHistory.user_id == self.user.discord_id, TurnHistory.turn_id.in_(turn_ids)
+        )
+        turns = {turn.turn_id: turn for turn in (await self.session.scalars(stmt)).all()}
+        return [turns[turn_id] for turn_id in turn_ids if turn_id in turns]
+
+    def _refresh_name(self):
+        if self.user.name != self.discord_user.display_name:
+            self.user.name = self.discord_user.display_name
+
+    def _ensure_global_memory(self):
+        if self.server_key is not None and self.global_memory is None:
+            self.global_memory = GlobalMemory(key=self.server_key, content="")
+            self.session.add(self.global_memory)
+
+    def add_task(self, task):
+        self.user.tasks.append(task)
+        return task
+
+    async def search_tasks(self, query, limit=TASK_SEARCH_LIMIT, include_completed=False):
+        terms = list(dict.fromkeys(SEARCH_TOKEN_PATTERN.findall(query.casefold())))[:8]
+        if not terms:
+            return []
+        stmt = select(Task).where(Task.user_id == self.user.discord_id)
+        if not include_completed:
+            stmt = stmt.where(Task.completed.is_(False))
+        if TASK_SEARCH == "fts5":
+            match = " OR ".join(f'"{term}"*' for term in terms)
+            stmt = (
+                stmt.join(TASKS_FTS, TASKS_FTS.c.rowid == Task.task_id)
+                .where(text("tasks_fts MATCH :match").bindparams(match=match))
+                .order_by(text("bm25(tasks_fts)"))
+            )
+        elif TASK_SEARCH == "tsvector":
+            tsquery = func.to_tsquery(literal_column("'simple'"), " | ".join(f"{term}:*" for term in terms))
+            stmt = stmt.where(TASK_SEARCH_VECTOR.op("@@")(tsquery)).order_by(
+                func.ts_rank(TASK_SEARCH_VECTOR, tsquery).desc()
+            )
+        else:
+            stmt = stmt.where(
+                or_(*(field.ilike(f"%{term}%") for term in terms for field in (Task.description, Task.progress)))
+            ).order_by(Task.created_at.desc())
+        metrics.incr("tasks.searches")
+        return list((await self.session.scalars(stmt.limit(limit))).all())
+
+    async def context_tasks(self, query):
+        recent = [task for task in self.user.tasks if not task.completed][-TASK_CONTEXT_LIMIT:]
+        matches = await self.search_tasks(query) if query else []
+        tasks = {task.task_id: task for task in matches + recent}
+        return [task.to_dict() for task in tasks.values()]
+
+    async def get_task(self, task_id):
+        for task in self.user.tasks:
+            if task.task_id == task_id:
+                return task
+        task = await self.session.get(Task, task_id)
+        if task and task.user_id == self.user.discord_id:
+            return task
+        return None
+
+
+def _async_url(db_url):
+    url = make_url(db_url)
+    if url.drivername in ASYNC_DRIVERS:
+        url = url.set(drivername=ASYNC_DRIVERS[url.drivername])
+    return url
+
+
+def _add_missing_task_columns(engine):
+    existing = {column["name"] for column in inspect(engine).get_columns("tasks")}
+    with engine.begin() as conn:
+        for name, column_type in TASK_COLUMN_MIGRATIONS.items():
+            if name not in existing:
+                conn.execute(text(f"ALTER TABLE tasks ADD COLUMN {name} {column_type}"))
+
+
+def _ensure_task_search(engine):
+    global TASK_SEARCH
+    dialect = engine.dialect.name
+    try:
+        if dialect == "sqlite":
+            if not inspect(engine).has_table("tasks_fts"):
+                with engine.begin() as conn:
+                    for statement in SQLITE_TASK_FTS_DDL:
+                        conn.execute(text(statement))
+            TASK_SEARCH = "fts5"
+        elif dialect == "postgresql":
+            with engine.begin() as conn:
+                conn.execute(text(POSTGRES_TASK_SEARCH_DDL))
+            TASK_SEARCH = "tsvector"
+        else:
+            TASK_SEARCH = "like"
+    except OperationalError:
+        logger.warning("Full-text task search unavailable on %s; falling back to LIKE.", dialect, exc_info=True)
+        TASK_SEARCH = "like"
+
+
+def ensure_schema():
+    global SCHEMA_READY
+    if SCHEMA_READY:
+        return
+    with SCHEMA_LOCK:
+        if SCHEMA_READY:
+            return
+        Base.metadata.create_all(engine)
+        _add_missing_task_columns(engine)
+        for index in Task.__table__.indexes:
+            index.create(engine, checkfirst=True)
+        _ensure_task_search(engine)
+        SCHEMA_READY = True
+
+
+async def ensure_schema_async():
+    if not SCHEMA_READY:
+        await asyncio.to_thread(ensure_schema)
+
+
+def initialize_connection(db_url: str, pool_size=5, max_overflow=10, use_async=False, lazy_schema=False):
+    global engine, Session, async_engine, AsyncSession, SCHEMA_READY
     engine = create_engine(db_url)
-    Base.metadata.create_all(engine)
+    SCHEMA_READY = False
+    if not lazy_schema:
+        ensure_schema()
     Session = sessionmaker(bind=engine)
+    if use_async:
+        async_url = _async_url(db_url)
+        pool_options = {}
+        if issubclass(async_url.get_dialect().get_pool_class(async_url), QueuePool):
+            pool_options = {"pool_size": pool_size, "max_overflow": max_overflow}
+        async_engine = create_async_engine(async_url, pool_pre_ping=True, **pool_options)
+        AsyncSession = async_sessionmaker(async_engine, expire_on_commit=False)
@@ -1,6 +1,29 @@
+import json
+from datetime import datetime, timezone
+
 import data_models
 from chat import register_tool
 
+TASK_MATCH_CANDIDATES = 5
+
+
+def _parse_remind_at(value):
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _matches_all_terms(task, query):
+    words = data_models.SEARCH_TOKEN_PATTERN.findall(f"{task.description} {task.progress or ''}".casefold())
+    terms = data_models.SEARCH_TOKEN_PATTERN.findall(query.casefold())
+    return all(any(word.startswith(term) for word in words) for term in terms)
+
 
 @register_tool(
     description="Add a task for the user.",
@@ -13,46 +36,82 @@ from chat import register_tool
             },
             "description": {"type": "string"},
             "due_text": {"type": "string"},
+            "remind_at": {
+                "type": "string",
+                "description": "ISO 8601 UTC time to DM the user a reminder, only if they asked for one.",
+            },
         },
         "required": ["task_type", "description"],
     },
 )
-def add_task(context, task_type, description, due_text=None):
-    discord_id = context.discord_id
-    with data_models.Session() as session:
-        user = session.get(data_models.User, discord_id)
-        user.tasks.append(
-            data_models.Task(
-                task_type=task_type,
-                description=description,
-                due_text=due_text,
-                progress=None,
-            )
+def add_task(context, task_type, description, due_text=None, remind_at=None):
+    context.unit_of_work.add_task(
+        data_models.Task(
+            task_type=task_type,
+            description=description,
+            due_text=due_text,
+            progress=None,
+            remind_at=_parse_remind_at(remind_at),
         )
-        session.commit()
-        return f"Added {task_type} task: {description}"
+    )
+    return f"Added {task_type} task: {description}"
 
 
 @register_tool(
-    description="Update progress for a task. If the progress indicates completion, mark the task as completed.",
+    description=(
+        "Search the user's tasks by keywords. Use this when the user asks about a task "
+        "that is not listed in user.tasks."
+    ),
+    parameters={
+        "type": "object",
+        "properties": {
+            "query": {"type": "string"},
+            "include_completed": {"type": "boolean"},
+        },
+        "required": ["query"],
+    },
+)
+async def search_tasks(context, query, include_completed=False):
+    tasks = await context.unit_of_work.search_tasks(query, include_completed=include_completed)
+    if not tasks:
+        return f"No tasks matched: {query}"
+    return json.dumps([task.to_dict() for task in tasks], ensure_ascii=False)
+
+
+@register_tool(
+    description=(
+        "Update progress for a task. If the progress indicates completion, mark the task as completed. "
+        "Pass task_id when the task is listed in user.tasks, otherwise pass task_query with keywords "
+        "describing the task."
+    ),
     parameters={
         "type": "object",
         "properties": {
             "task_id": {"type": "integer"},
+            "task_query": {"type": "string"},
             "progress": {"type": "string"},
             "is_task_completed": {"type": "boolean"},
         },
-        "required": ["task_id", "progress", "is_task_completed"],
+        "required": ["progress", "is_task_completed"],
     },
 )
-def update_progress(context, task_id, progress, is_task_completed):
-    discord_id = context.discord_id
-    with data_models.Session() as session:
-        task = session.get(data_models.Task, task_id)
-        if task and task.user_id == discord_id:
-            task.progress = progress
-            task.completed = is_task_completed
-            session.commit()
-            suffix = " and marked complete" if is_task_completed else ""
-            return f"Updated task {task_id}: {progress}{suffix}"
-        return f"Task {task_id} not found for this user."
+async def update_progress(context, progress, is_task_completed, task_id=None, task_query=None):
+    task = await context.unit_of_work.get_task(task_id) if task_id is not None else None
+    if task is None and task_query:
+        matches = await context.unit_of_work.search_tasks(task_query, limit=TASK_MATCH_CANDIDATES)
+        candidates = matches if len(matches) < 2 else [m for m in matches if _matches_all_terms(m, task_query)]
+        if len(candidates) == 1:
+            task = candidates[0]
+        elif matches:
+            candidates = candidates or matches
+            return (
+                f"Several tasks match {task_query}; call update_progress again with the task_id of the right one: "
+                + json.dumps([candidate.to_dict() for candidate in candidates], ensure_ascii=False)
+            )
+    if task:
+        task_id = task.task_id
+        task.progress = progress
+        task.completed = is_task_completed
+        suffix = " and marked complete" if is_task_completed else ""
+        return f"Updated task {task_id}: {progress}{suffix}"
+    return f"Task {task_id if task_id is not None else task_query} not found for this user."
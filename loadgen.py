@@ -0,0 +1,303 @@
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+logger = logging.getLogger("ibis.loadgen")
+
+BOT_USER_ID = 1
+BOT_USER = SimpleNamespace(id=BOT_USER_ID, display_name="Xander", bot=True)
+GUILD_ID = 1
+SNOWFLAKES = itertools.count(1_000_000)
+PROMPTS = [
+    "hey what are you up to today",
+    "i finally finished my cosplay wig!!",
+    "have you heard the new honeyworks song",
+    "add a task to clean my room tomorrow",
+    "i'm so tired of work lol",
+]
+
+
+def _fake_arguments(schema):
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: _fake_arguments(prop) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return []
+    if kind == "boolean":
+        return True
+    if kind == "integer":
+        return schema.get("maximum", 5)
+    return "stub"
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.2
+    jitter = 0.1
+    error_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(max(0.0, random.gauss(self.latency, self.jitter)))
+        if random.random() < self.error_rate:
+            self.send_response(500)
+            self.end_headers()
+            return
+        tools = body.get("tools") or []
+        message = {"role": "assistant", "content": "stub reply"}
+        if tools:
+            choice = body.get("tool_choice")
+            names = [tool["function"]["name"] for tool in tools]
+            if isinstance(choice, dict):
+                name = choice["function"]["name"]
+            else:
+                name = "respond_normally" if "respond_normally" in names else names[0]
+            tool = tools[names.index(name)]
+            arguments = _fake_arguments(tool["function"]["parameters"])
+            if "messages" in arguments:
+                arguments["messages"] = ["stub reply"]
+            message = {
+                "role": "assistant",
+                "content": None,
+                "tool_calls": [
+                    {
+                        "id": f"call_{next(SNOWFLAKES)}",
+                        "type": "function",
+                        "function": {"name": name, "arguments": json.dumps(arguments)},
+                    }
+                ],
+            }
+        prompt_tokens = sum(len(m.get("content") or "") for m in body["messages"]) // 4
+        payload = {
+            "id": "chatcmpl-stub",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body["model"],
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 20, "total_tokens": prompt_tokens + 20},
+        }
+        data = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve_stub(port, latency, jitter, error_rate):
+    StubOpenAIHandler.latency = latency
+    StubOpenAIHandler.jitter = jitter
+    StubOpenAIHandler.error_rate = error_rate
+    ThreadingHTTPServer(("127.0.0.1", port), StubOpenAIHandler).serve_forever()
+
+
+class FakeChannel:
+    def __init__(self, channel_id, guild):
+        self.id = channel_id
+        self.guild = guild
+
+    async def history(self, limit=10, before=None):
+        for _ in ():
+            yield
+
+    async def fetch_message(self, message_id):
+        raise LookupError(message_id)
+
+    def typing(self):
+        return _NullAsyncContext()
+
+
+class _NullAsyncContext:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+class FakeMessage:
+    def __init__(self, author, channel, content, mentions, on_reply):
+        self.id = next(SNOWFLAKES)
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.mentions = mentions
+        self.reference = None
+        self.created_at = datetime.now(timezone.utc)
+        self.on_reply = on_reply
+
+    async def reply(self, text, mention_author=False):
+        self.on_reply(text)
+
+
+class FakeInteraction:
+    def __init__(self, user, on_reply):
+        self.user = user
+        self.response = SimpleNamespace(defer=self._defer)
+        self.followup = SimpleNamespace(send=self._send)
+        self.on_reply = on_reply
+
+    async def _defer(self):
+        pass
+
+    async def _send(self, text):
+        self.on_reply(text)
+
+
+def _counter_delta(before, after, name):
+    return after.get(name, 0) - before.get(name, 0)
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def run_level(bot, metrics, concurrency, guilds, turns_per_user, slash_ratio):
+    channels = [FakeChannel(next(SNOWFLAKES), SimpleNamespace(id=GUILD_ID + g)) for g in range(guilds)]
+    latencies = []
+    outcomes = {"ok": 0, "shed": 0, "failed": 0}
+
+    async def simulate_user(index):
+        author = SimpleNamespace(id=10_000 + index, display_name=f"user{index}", bot=False)
+        channel = channels[index % guilds]
+        for turn in range(turns_per_user):
+            replies = []
+            prompt = PROMPTS[(index + turn) % len(PROMPTS)]
+            started = time.perf_counter()
+            try:
+                if random.random() < slash_ratio:
+                    await bot.update_cmd.callback(FakeInteraction(author, replies.append), prompt)
+                else:
+                    message = FakeMessage(author, channel, f"<@{BOT_USER_ID}> {prompt}", [BOT_USER], replies.append)
+                    await bot.on_message(message)
+            except Exception:
+                logger.exception("Turn failed for %s", author.display_name)
+                outcomes["failed"] += 1
+                continue
+            if not replies:
+                outcomes["failed"] += 1
+            elif replies[0] == bot.BUSY_REPLY:
+                outcomes["shed"] += 1
+            else:
+                outcomes["ok"] += 1
+                latencies.append(time.perf_counter() - started)
+
+    before = metrics.snapshot()["counters"]
+    started = time.perf_counter()
+    await asyncio.gather(*(simulate_user(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    after = metrics.snapshot()["counters"]
+    latencies.sort()
+    served = max(outcomes["ok"], 1)
+    return {
+        "concurrency": concurrency,
+        **outcomes,
+        "turns_per_second": outcomes["ok"] / elapsed,
+        "p50_seconds": _percentile(latencies, 50),
+        "p95_seconds": _percentile(latencies, 95),
+        "p99_seconds": _percentile(latencies, 99),
+        "llm_calls_per_turn": _counter_delta(before, after, "llm.calls") / served,
+        "db_round_trips_per_turn": _counter_delta(before, after, "loadgen.db_round_trips") / served,
+    }
+
+
+async def run(args, base_url, db_url):
+    from sqlalchemy import event
+
+    import bot
+    import chat
+    import data_models
+    import metrics
+
+    keyring = {
+        "guild_id": GUILD_ID,
+        "openai_api_key": "stub",
+        "openai_base_url": base_url,
+        "db_url": db_url,
+        "max_concurrent_turns": args.max_concurrent_turns,
+        "max_queued_turns": args.max_queued_turns,
+        "max_queued_turns_per_user": args.turns_per_user,
+        "user_turns_per_minute": 0,
+        "guild_turns_per_minute": 0,
+    }
+    bot.connect_database(keyring)
+    chat.initialize_connection(keyring)
+    bot.create_client(keyring)
+    bot.client = SimpleNamespace(user=BOT_USER)
+    await data_models.ensure_schema_async()
+
+    @event.listens_for(data_models.async_engine.sync_engine, "before_cursor_execute")
+    def count_round_trip(*_):
+        metrics.incr("loadgen.db_round_trips")
+
+    results = []
+    for level in args.levels:
+        result = await run_level(
+            bot, metrics, level, min(level, args.guilds), args.turns_per_user, args.slash_ratio
+        )
+        results.append(result)
+        logger.info("level %d done: %s", level, result)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Drive the bot's message handler with synthetic multi-guild load.")
+    parser.add_argument("--levels", default="1,5,10,25,50", help="Comma-separated concurrent user counts.")
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--turns-per-user", type=int, default=5)
+    parser.add_argument("--slash-ratio", type=float, default=0.1, help="Share of turns sent through /update.")
+    parser.add_argument("--max-concurrent-turns", type=int, default=8)
+    parser.add_argument("--max-queued-turns", type=int, default=100)
+    parser.add_argument("--llm-latency-ms", type=float, default=200)
+    parser.add_argument("--llm-jitter-ms", type=float, default=100)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--stub-port", type=int, default=8765)
+    parser.add_argument("--db-url", help="Defaults to a fresh SQLite file in a temp directory.")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+    args.levels = [int(level) for level in args.levels.split(",")]
+
+    logging.basicConfig(level=logging.CRITICAL, format="%(asctime)s [%(levelname)s] %(name)s: %(message)s")
+    logger.setLevel(logging.INFO)
+    stub = multiprocessing.Process(
+        target=serve_stub,
+        args=(args.stub_port, args.llm_latency_ms / 1000, args.llm_jitter_ms / 1000, args.llm_error_rate),
+        daemon=True,
+    )
+    stub.start()
+    time.sleep(0.5)
+    with tempfile.TemporaryDirectory() as scratch:
+        db_url = args.db_url or f"sqlite:///{os.path.join(scratch, 'loadgen.db')}"
+        try:
+            results = asyncio.run(run(args, f"http://127.0.0.1:{args.stub_port}/v1", db_url))
+        finally:
+            stub.terminate()
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    columns = ["concurrency", "ok", "shed", "failed", "turns_per_second", "p50_seconds", "p95_seconds", "p99_seconds",
+               "llm_calls_per_turn", "db_round_trips_per_turn"]
+    print("  ".join(f"{name:>12.12}" for name in columns))
+    for result in results:
+        print("  ".join(f"{result[name]:>12.3f}" if isinstance(result[name], float) else f"{result[name]:>12}"
+                        for name in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+import contextlib
+import logging
+import time
+from collections import Counter, deque
+from threading import Lock
+
+logger = logging.getLogger("ibis.metrics")
+SAMPLE_WINDOW = 1024
+
+LOCK = Lock()
+COUNTERS = Counter()
+GAUGES = {}
+SAMPLES = {}
+
+
+def incr(name, value=1):
+    with LOCK:
+        COUNTERS[name] += value
+
+
+def set_gauge(name, value):
+    with LOCK:
+        GAUGES[name] = value
+
+
+def observe(name, value):
+    with LOCK:
+        if name not in SAMPLES:
+            SAMPLES[name] = deque(maxlen=SAMPLE_WINDOW)
+        SAMPLES[name].append(value)
+
+
+@contextlib.contextmanager
+def timed(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - started)
+
+
+def _percentile(ordered, pct):
+    if not ordered:
+        return 0.0
+    idx = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[idx]
+
+
+def snapshot():
+    with LOCK:
+        counters = dict(COUNTERS)
+        gauges = dict(GAUGES)
+        samples = {name: sorted(values) for name, values in SAMPLES.items()}
+    summaries = {
+        name: {
+            "count": len(ordered),
+            "p50": _percentile(ordered, 50),
+            "p95": _percentile(ordered, 95),
+            "p99": _percentile(ordered, 99),
+        }
+        for name, ordered in samples.items()
+    }
+    return {"counters": counters, "gauges": gauges, "samples": summaries}
+
+
+def log_snapshot():
+    logger.info("metrics %s", snapshot())
@@ -1,13 +1,20 @@
 import re
+from collections import OrderedDict, deque
 
+import metrics
 
-async def replace_mentions(message, bot_user_id):
-    pattern = re.compile(r"<@!?(\d+)>|@everyone|@here")
+MENTION_PATTERN = re.compile(r"<@!?(\d+)>|@everyone|@here")
+CHANNEL_BUFFER_SIZE = 50
+MAX_CHANNELS = 1000
+CHANNEL_BUFFERS = OrderedDict()
+
+
+def _clean_text(message, bot_user_id):
     mentions = {m.id: m.display_name for m in message.mentions}
     text = message.content
     parts = []
     cursor = 0
-    for match in pattern.finditer(text):
+    for match in MENTION_PATTERN.finditer(text):
         parts.append(text[cursor : match.start()])
         token = match.group(0)
         user_id = match.group(1)
@@ -30,33 +37,102 @@ async def replace_mentions(message, bot_user_id):
     return "".join(parts)
 
 
+async def replace_mentions(message, bot_user_id):
+    return _clean_text(message, bot_user_id)
+
+
+def _to_row(message, bot_user_id):
+    ref = message.reference
+    return {
+        "id": message.id,
+        "created_at": message.created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "speaker": ("Xander" if message.author.id == bot_user_id else message.author.display_name),
+        "text": _clean_text(message, bot_user_id),
+        "reply_to": ref.message_id if ref else None,
+    }
+
+
+def _channel_buffer(channel_id):
+    buffer = CHANNEL_BUFFERS.get(channel_id)
+    if buffer is None:
+        buffer = {"rows": deque(maxlen=CHANNEL_BUFFER_SIZE), "by_id": {}, "warm": False}
+        CHANNEL_BUFFERS[channel_id] = buffer
+        while len(CHANNEL_BUFFERS) > MAX_CHANNELS:
+            CHANNEL_BUFFERS.popitem(last=False)
+    else:
+        CHANNEL_BUFFERS.move_to_end(channel_id)
+    return buffer
+
+
+def _append_row(buffer, row):
+    if row["id"] in buffer["by_id"]:
+        return
+    rows = buffer["rows"]
+    if len(rows) == rows.maxlen:
+        buffer["by_id"].pop(rows[0]["id"], None)
+    rows.append(row)
+    buffer["by_id"][row["id"]] = row
+
+
+def ingest_message(message, bot_user_id):
+    _append_row(_channel_buffer(message.channel.id), _to_row(message, bot_user_id))
+
+
+def update_message(message, bot_user_id):
+    buffer = CHANNEL_BUFFERS.get(message.channel.id)
+    if buffer and message.id in buffer["by_id"]:
+        buffer["by_id"][message.id].update(_to_row(message, bot_user_id))
+
+
+def remove_message(channel_id, message_id):
+    buffer = CHANNEL_BUFFERS.get(channel_id)
+    if buffer and message_id in buffer["by_id"]:
+        row = buffer["by_id"].pop(message_id)
+        buffer["rows"].remove(row)
+
+
+async def _warm_channel(buffer, message, bot_user_id, history_limit):
+    fetched = [_to_row(item, bot_user_id) async for item in message.channel.history(limit=history_limit, before=message)]
+    merged = {row["id"]: row for row in fetched}
+    merged.update(buffer["by_id"])
+    buffer["rows"].clear()
+    buffer["by_id"].clear()
+    for msg_id in sorted(merged):
+        _append_row(buffer, merged[msg_id])
+    buffer["warm"] = True
+    metrics.incr("recent_messages.cold_fetch")
+
+
 async def collect_recent_messages(message, bot_user_id, history_limit=10, reply_chain_limit=5):
-    messages_by_id = {}
-    async for item in message.channel.history(limit=history_limit, before=message):
-        cleaned = await replace_mentions(item, bot_user_id)
-        messages_by_id[item.id] = {
-            "id": item.id,
-            "created_at": item.created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "speaker": ("Xander" if item.author.id == bot_user_id else item.author.display_name),
-            "text": cleaned,
-        }
-
-    current = message
+    buffer = _channel_buffer(message.channel.id)
+    if not buffer["warm"]:
+        await _warm_channel(buffer, message, bot_user_id, history_limit)
+    else:
+        metrics.incr("recent_messages.buffer_hit")
+
+    earlier = [row for row in buffer["rows"] if row["id"] < message.id]
+    messages_by_id = {row["id"]: row for row in earlier[-history_limit:]}
+
+    ref = message.reference
+    ref_id = ref.message_id if ref else None
+    resolved = ref.resolved if ref else None
     for _ in range(reply_chain_limit):
-        ref = current.reference
-        if not ref:
+        if not ref_id:
             break
-        prev_msg = ref.resolved or await message.channel.fetch_message(ref.message_id)
-        cleaned = await replace_mentions(prev_msg, bot_user_id)
-        messages_by_id[prev_msg.id] = {
-            "id": prev_msg.id,
-            "created_at": prev_msg.created_at.strftime("%Y-%m-%dT%H:%M:%SZ"),
-            "speaker": ("Xander" if prev_msg.author.id == bot_user_id else prev_msg.author.display_name),
-            "text": cleaned,
-        }
-        current = prev_msg
-
-    merged = sorted(messages_by_id.values(), key=lambda row: row["created_at"])
+        row = buffer["by_id"].get(ref_id)
+        if row is None:
+            if resolved is None or getattr(resolved, "id", None) != ref_id or not hasattr(resolved, "author"):
+                metrics.incr("recent_messages.reply_fetch")
+                try:
+                    resolved = await message.channel.fetch_message(ref_id)
+                except Exception:
+                    break
+            row = _to_row(resolved, bot_user_id)
+        messages_by_id[row["id"]] = row
+        ref_id = row["reply_to"]
+        resolved = None
+
+    merged = sorted(messages_by_id.values(), key=lambda row: row["id"])
     lines = []
     for row in merged:
         lines.append(f"[{row['created_at']}] {row['speaker']}: {row['text']}")
@@ -0,0 +1,95 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+IMPORT_PHASES = [
+    "discord",
+    "sqlalchemy",
+    "numpy",
+    "requests",
+    "metrics",
+    "data_models",
+    "chat",
+    "bot",
+]
+
+
+def _timed(timings, name, fn):
+    started = time.perf_counter()
+    result = fn()
+    timings[name] = time.perf_counter() - started
+    return result
+
+
+def measure(keyring_path, db_url=None):
+    process_started = time.perf_counter()
+    timings = {}
+    for module in IMPORT_PHASES:
+        _timed(timings, f"import.{module}", lambda: __import__(module))
+
+    import bot
+    import chat
+    import data_models
+    from chat import rag
+
+    keyring = _timed(timings, "init.keyring", lambda: bot.load_keyring(keyring_path))
+    if db_url:
+        keyring["db_url"] = db_url
+    _timed(timings, "init.db_connect", lambda: bot.connect_database(keyring))
+    _timed(timings, "init.chat_config", lambda: chat.initialize_connection(keyring))
+    _timed(timings, "init.discord_client", lambda: bot.create_client(keyring))
+    timings["before_gateway_connect"] = time.perf_counter() - process_started
+
+    _timed(timings, "lazy.schema_check", data_models.ensure_schema)
+    _timed(timings, "lazy.openai_client", chat.get_client)
+    _timed(timings, "lazy.lyrics_cache", rag.ensure_cache_loaded)
+    timings["total"] = time.perf_counter() - process_started
+    return timings
+
+
+def run_child(keyring_path, db_url):
+    args = [sys.executable, __file__, "--child", "--keyring", keyring_path]
+    if db_url:
+        args += ["--db-url", db_url]
+    output = subprocess.run(args, check=True, capture_output=True, text=True).stdout
+    return json.loads(output)
+
+
+def summarize(runs):
+    phases = list(runs[0])
+    return {
+        phase: {
+            "median": statistics.median(run[phase] for run in runs),
+            "max": max(run[phase] for run in runs),
+        }
+        for phase in phases
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure import and initialization cost of each bot startup phase.")
+    parser.add_argument("--keyring", default="keyring.json")
+    parser.add_argument("--db-url", help="Override the keyring's db_url, e.g. a scratch SQLite file.")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreter runs to aggregate.")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON for tracking.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(measure(args.keyring, args.db_url)))
+        return
+
+    summary = summarize([run_child(args.keyring, args.db_url) for _ in range(args.runs)])
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+    print(f"{'phase':<28}{'median ms':>12}{'max ms':>12}")
+    for phase, stats in summary.items():
+        print(f"{phase:<28}{stats['median'] * 1000:>12.1f}{stats['max'] * 1000:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import contextlib
+import json
+import sqlite3
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS turn_jobs (
+    job_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_key TEXT NOT NULL,
+    status TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    result TEXT,
+    worker_id TEXT,
+    enqueued_at REAL NOT NULL,
+    claimed_at REAL
+);
+CREATE INDEX IF NOT EXISTS ix_turn_jobs_status ON turn_jobs (status, job_id);
+CREATE INDEX IF NOT EXISTS ix_turn_jobs_user_status ON turn_jobs (user_key, status);
+"""
+
+
+class TurnQueue:
+    def __init__(self, path, lease_seconds=600):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    @contextlib.contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, user_key, payload, max_queued_per_user, max_queued_total):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            total, for_user = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(user_key = ?), 0) FROM turn_jobs WHERE status = 'queued'",
+                (str(user_key),),
+            ).fetchone()
+            if total >= max_queued_total or for_user >= max_queued_per_user:
+                conn.execute("ROLLBACK")
+                return None
+            cursor = conn.execute(
+                "INSERT INTO turn_jobs (user_key, status, payload, enqueued_at) VALUES (?, 'queued', ?, ?)",
+                (str(user_key), json.dumps(payload, ensure_ascii=False), time.time()),
+            )
+            conn.execute("COMMIT")
+            return cursor.lastrowid
+
+    def claim(self, worker_id):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE turn_jobs SET status = 'queued', worker_id = NULL WHERE status = 'running' AND claimed_at < ?",
+                (now - self.lease_seconds,),
+            )
+            row = conn.execute(
+                "SELECT job_id, payload, enqueued_at FROM turn_jobs WHERE status = 'queued' "
+                "AND user_key NOT IN (SELECT user_key FROM turn_jobs WHERE status = 'running') "
+                "ORDER BY job_id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE turn_jobs SET status = 'running', worker_id = ?, claimed_at = ? WHERE job_id = ?",
+                (worker_id, now, row["job_id"]),
+            )
+            conn.execute("COMMIT")
+            return row["job_id"], json.loads(row["payload"]), now - row["enqueued_at"]
+
+    def _finish(self, job_id, status, result):
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE turn_jobs SET status = ?, result = ? WHERE job_id = ? AND status = 'running'",
+                (status, result, job_id),
+            )
+
+    def complete(self, job_id, reply_text):
+        self._finish(job_id, "done", reply_text)
+
+    def fail(self, job_id, error):
+        self._finish(job_id, "failed", error)
+
+    def take_finished(self, limit=50):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT job_id, status, payload, result FROM turn_jobs WHERE status IN ('done', 'failed') "
+                "ORDER BY job_id LIMIT ?",
+                (limit,),
+            ).fetchall()
+            conn.executemany("DELETE FROM turn_jobs WHERE job_id = ?", [(row["job_id"],) for row in rows])
+            conn.execute("COMMIT")
+        return [(row["job_id"], row["status"], json.loads(row["payload"]), row["result"]) for row in rows]
+
+    def depth(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM turn_jobs WHERE status = 'queued'").fetchone()[0]
@@ -0,0 +1,166 @@
+import asyncio
+import contextlib
+import copy
+import logging
+from datetime import datetime
+from types import SimpleNamespace
+
+import chat
+import data_models
+import metrics
+from chat import memory
+
+logger = logging.getLogger("ibis.turns")
+
+SUMMARY_BATCH_TURNS = 5
+SUMMARY_IDLE_SECONDS = 300
+FOLD_ATTEMPTS = 3
+
+
+def configure(keyring):
+    global SUMMARY_BATCH_TURNS, SUMMARY_IDLE_SECONDS
+    SUMMARY_BATCH_TURNS = keyring.get("summary_batch_turns", SUMMARY_BATCH_TURNS)
+    SUMMARY_IDLE_SECONDS = keyring.get("summary_idle_seconds", SUMMARY_IDLE_SECONDS)
+
+
+def save_context(context, unit_of_work):
+    unit_of_work.user.update_profile(context.user["profile"])
+    unit_of_work.user.conversation_summary = context.user["conversation_summary"]
+    if unit_of_work.global_memory is not None:
+        unit_of_work.global_memory.content = context.global_memory
+
+
+def build_context(
+    unit_of_work,
+    discord_user,
+    text,
+    recent_messages=None,
+    pending_turns=None,
+    long_term_memory=None,
+    tasks=None,
+    cancel_token=None,
+    channel_id=None,
+):
+    global_memory = unit_of_work.global_memory.content if unit_of_work.global_memory is not None else ""
+    user = unit_of_work.user.to_jsonable()
+    if tasks is not None:
+        user["tasks"] = tasks
+    return chat.ConversationContext(
+        current_time=datetime.now().isoformat(timespec="minutes"),
+        user=user,
+        discord_username=discord_user.display_name,
+        input_text=text,
+        discord_id=discord_user.id,
+        channel_id=channel_id,
+        global_memory=global_memory,
+        recent_messages=recent_messages,
+        loop=asyncio.get_running_loop(),
+        unit_of_work=unit_of_work,
+        pending_turns=[turn.turn_text for turn in pending_turns or []],
+        long_term_memory=long_term_memory,
+        cancel_token=cancel_token,
+    )
+
+
+async def recall_turns(unit_of_work, text, pending):
+    try:
+        turn_ids = await asyncio.to_thread(memory.search, unit_of_work.user.discord_id, text)
+    except Exception:
+        logger.exception("Failed to recall turns for user=%s", unit_of_work.user.discord_id)
+        return []
+    pending_texts = {turn.turn_text for turn in pending}
+    turns = await unit_of_work.load_turn_history(turn_ids)
+    return memory.fit_to_budget([turn.turn_text for turn in turns if turn.turn_text not in pending_texts])
+
+
+async def index_turn(user_id, turn_id, turn_text):
+    try:
+        await asyncio.to_thread(memory.add_turn, user_id, turn_id, turn_text)
+    except Exception:
+        logger.exception("Failed to index turn %s for user=%s", turn_id, user_id)
+
+
+def _global_memory_content(unit_of_work):
+    return unit_of_work.global_memory.content if unit_of_work.global_memory is not None else None
+
+
+async def _fold(context, user_before, global_memory, texts):
+    context.user = copy.deepcopy(user_before)
+    if global_memory is not None:
+        context.global_memory = global_memory
+    await asyncio.to_thread(context.fold_turns, texts)
+
+
+async def _apply_fold(unit_of_work, context, pending):
+    save_context(context, unit_of_work)
+    await unit_of_work.consume_pending_turns(pending)
+    await unit_of_work.commit()
+
+
+async def fold_pending_turns(unit_of_work, context, pending, turn_texts, memory_lane=None, lock_memory=False):
+    texts = [turn.turn_text for turn in pending] + turn_texts
+    user_before = copy.deepcopy(context.user)
+    for _ in range(FOLD_ATTEMPTS - 1):
+        base = await unit_of_work.peek_global_memory()
+        await _fold(context, user_before, base, texts)
+        async with memory_lane or contextlib.nullcontext():
+            await unit_of_work.refresh_global_memory(lock=lock_memory)
+            if _global_memory_content(unit_of_work) == base:
+                await _apply_fold(unit_of_work, context, pending)
+                return
+            await unit_of_work.commit()
+        metrics.incr("summary.fold_conflicts")
+    async with memory_lane or contextlib.nullcontext():
+        await unit_of_work.refresh_global_memory(lock=lock_memory)
+        await _fold(context, user_before, _global_memory_content(unit_of_work), texts)
+        await _apply_fold(unit_of_work, context, pending)
+
+
+async def run_turn(
+    discord_user,
+    server_key,
+    text,
+    recent_messages=None,
+    memory_lane=None,
+    lock_memory=False,
+    cancel_token=None,
+    channel_id=None,
+):
+    async with data_models.TurnUnitOfWork(discord_user, server_key) as unit_of_work:
+        pending = unit_of_work.pending_turns
+        long_term_memory = await recall_turns(unit_of_work, text, pending)
+        tasks = await unit_of_work.context_tasks(text)
+        await unit_of_work.end_reads()
+        context = build_context(
+            unit_of_work,
+            discord_user,
+            text,
+            recent_messages,
+            pending,
+            long_term_memory,
+            tasks,
+            cancel_token,
+            channel_id,
+        )
+        reply_text = await asyncio.to_thread(context.respond)
+        context.commit()
+        turn_text = context.turn_text(reply_text)
+        history = unit_of_work.record_turn(turn_text)
+        if len(pending) + 1 >= SUMMARY_BATCH_TURNS:
+            await fold_pending_turns(unit_of_work, context, pending, [turn_text], memory_lane, lock_memory)
+        else:
+            unit_of_work.add_pending_turn(turn_text)
+            await unit_of_work.commit()
+    await index_turn(discord_user.id, history.turn_id, turn_text)
+    return reply_text
+
+
+async def flush_pending_turns(user_id, name, server_key, memory_lane=None, lock_memory=False):
+    discord_user = SimpleNamespace(id=user_id, display_name=name)
+    async with data_models.TurnUnitOfWork(discord_user, server_key) as unit_of_work:
+        pending = unit_of_work.pending_turns
+        if not pending:
+            return False
+        context = build_context(unit_of_work, discord_user, "")
+        await fold_pending_turns(unit_of_work, context, pending, [], memory_lane, lock_memory)
+    return True